@@ -0,0 +1,3 @@
+"""
+crowd·noise backend sketches: small, self-contained engines behind the mockups.
+"""
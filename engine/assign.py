@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+"make this sound" assignment engine: hand each project's outstanding parts
+(kick, snare, keys, vocal texture, ...) to group members.
+
+Every group is a min-cost matching between parts and member *slots* (a member
+with capacity 3 shows up as 3 slots, each one a bit more expensive than the
+last, so work spreads out). Groups are bucketed by size and solved together as
+one batched, vectorized Hungarian solve, bounded by a time budget that covers
+building the cost matrices as well as solving them. Re-solves after a part is
+finished or dropped only touch the groups that changed, and a stickiness bonus
+keeps everyone else's parts where they were.
+
+Needs numpy.
+
+run:
+
+    python3 -m engine.assign bench --groups 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+# ---------------------------
+# Data
+# ---------------------------
+
+
+@dataclass
+class Member:
+    id: str
+    skills: Dict[str, float]  # part kind -> 0..1
+    contributions: Dict[str, int] = field(default_factory=dict)  # part kind -> parts made before
+    load: int = 0  # parts already on their plate elsewhere
+    capacity: int = 3  # most parts they can take in this group
+
+
+@dataclass
+class Part:
+    id: str
+    project: str
+    kind: str
+
+
+@dataclass
+class Group:
+    id: str
+    members: List[Member]
+    parts: List[Part]
+
+
+@dataclass
+class Weights:
+    skill: float = 1.0
+    history: float = 0.3  # per log(1 + past contributions of that kind)
+    load: float = 0.25  # per part already held
+    stickiness: float = 0.5  # keep the current assignee unless it's clearly worse
+
+
+# benefits are fixed-point integers (SCALE per unit weight) so sums and ties are exact
+SCALE = 1000
+UNASSIGNED = -5 * SCALE  # a part left unassigned
+DECLINED = -(10**9)  # a part offered to a member who dropped it; never chosen over UNASSIGNED
+MAX_LOAD_COST = 4.0  # cap on a slot's load penalty, so any real slot beats leaving the part unassigned
+BUCKET = 8  # problem sizes are padded up to a multiple of this before batching
+BUILD_SHARE = 0.4  # most of the budget building cost matrices may take; the rest is for solving
+FINISH_SHARE = 0.2  # budget held back for the greedy fallback and decoding
+
+
+# ---------------------------
+# Cost building
+# ---------------------------
+
+
+@dataclass
+class _Problem:
+    group: Group
+    member_ids: List[str]
+    slot_member: np.ndarray  # (n_slots,) index into member_ids
+    benefit: np.ndarray  # (n, n) int64; rows = parts + dummies, cols = slots + dummies
+    n_parts: int
+
+
+def _build(group: Group, w: Weights, current: Dict[str, str], declined: Set[Tuple[str, str]]) -> _Problem:
+    parts, members = group.parts, group.members
+    caps = np.array([max(0, m.capacity) for m in members], dtype=np.int64)
+    slot_member = np.repeat(np.arange(len(members)), caps)
+    n_parts, n_slots = len(parts), len(slot_member)
+    n = max(1, n_parts, n_slots)
+    member_ids = [m.id for m in members]
+
+    benefit = np.zeros((n, n), dtype=np.float64)
+    if n_parts and n_slots:
+        kinds = sorted({p.kind for p in parts})
+        kind_idx = {k: i for i, k in enumerate(kinds)}
+        skill = np.array([[m.skills.get(k, 0.0) for k in kinds] for m in members], dtype=np.float64)
+        hist = np.log1p(np.array([[m.contributions.get(k, 0) for k in kinds] for m in members], dtype=np.float64))
+        load = np.array([m.load for m in members], dtype=np.float64)
+        slot_k = np.arange(n_slots) - np.repeat(np.cumsum(caps) - caps, caps)
+        part_kind = np.array([kind_idx[p.kind] for p in parts], dtype=np.int64)
+
+        per_member = w.skill * skill + w.history * hist  # (M, K)
+        b = per_member[slot_member][:, part_kind].T  # (P, S)
+        b -= np.minimum(w.load * (load[slot_member] + slot_k), MAX_LOAD_COST)[None, :]
+        if current:
+            member_idx = {mid: i for i, mid in enumerate(member_ids)}
+            holder = np.array([member_idx.get(current.get(p.id), -1) for p in parts], dtype=np.int64)
+            b += w.stickiness * (slot_member[None, :] == holder[:, None])
+        if declined:
+            part_idx = {p.id: i for i, p in enumerate(parts)}
+            member_idx = {mid: i for i, mid in enumerate(member_ids)}
+            for part_id, member_id in declined:
+                pi, mi = part_idx.get(part_id), member_idx.get(member_id)
+                if pi is not None and mi is not None:
+                    b[pi, slot_member == mi] = DECLINED / SCALE
+        benefit[:n_parts, :n_slots] = b
+    # a real part on a dummy slot = left unassigned; dummy parts are free anywhere
+    benefit[:n_parts, n_slots:] = UNASSIGNED / SCALE
+    return _Problem(group, member_ids, slot_member, np.rint(benefit * SCALE).astype(np.int64), n_parts)
+
+
+def _pad(p: _Problem, n: int) -> np.ndarray:
+    k = p.benefit.shape[0]
+    if k == n:
+        return p.benefit
+    out = np.zeros((n, n), dtype=np.int64)
+    out[:k, :k] = p.benefit
+    out[: p.n_parts, k:] = UNASSIGNED
+    return out
+
+
+# ---------------------------
+# Batched Hungarian
+# ---------------------------
+
+
+def hungarian_batch(benefit: np.ndarray, deadline: Optional[float] = None) -> Tuple[np.ndarray, bool]:
+    """
+    Maximize sum(benefit[b, i, assign[b, i]]) for every b of a (B, n, n) stack.
+
+    Shortest-augmenting-path Hungarian (the classic O(n^3) row-by-row form),
+    run in lockstep over the whole stack: every step is one numpy op across all
+    problems still searching, so the python loop count depends on n, not B.
+    Returns (assign (B, n), converged). If `deadline` (perf_counter seconds)
+    passes first, rows not yet inserted get a greedy fill and converged is False.
+    """
+    B, n, _ = benefit.shape
+    converged = True
+    # 1-indexed with a virtual column 0, as in the textbook version
+    c = np.zeros((B, n + 1, n + 1))
+    c[:, 1:, 1:] = -benefit
+    u = np.zeros((B, n + 1))
+    v = np.zeros((B, n + 1))
+    p = np.zeros((B, n + 1), dtype=np.int64)  # p[b, j] = row matched to column j
+    way = np.zeros((B, n + 1), dtype=np.int64)
+
+    for i in range(1, n + 1):
+        if deadline is not None and time.perf_counter() > deadline:
+            converged = False
+            break
+        p[:, 0] = i
+        j0 = np.zeros(B, dtype=np.int64)
+        minv = np.full((B, n + 1), np.inf)
+        used = np.zeros((B, n + 1), dtype=bool)
+        act = np.arange(B)
+
+        # dijkstra over reduced costs until each problem reaches a free column;
+        # running out of time mid-row leaves row i to the greedy fill
+        while act.size:
+            if deadline is not None and time.perf_counter() > deadline:
+                converged = False
+                break
+            k = np.arange(act.size)
+            jj = j0[act]
+            used[act, jj] = True
+            um = used[act]
+            i0 = p[act, jj]
+            cur = c[act, i0, :] - u[act, i0][:, None] - v[act]
+            mv, wy = minv[act], way[act]
+            better = ~um & (cur < mv)
+            mv = np.where(better, cur, mv)
+            wy = np.where(better, jj[:, None], wy)
+
+            search = np.where(um, np.inf, mv)
+            j1 = search.argmin(axis=1)
+            delta = search[k, j1]
+
+            ai, aj = np.nonzero(um)
+            u[act[ai], p[act[ai], aj]] += delta[ai]
+            v[act] -= np.where(um, delta[:, None], 0.0)
+            minv[act] = np.where(um, mv, mv - delta[:, None])
+            way[act] = wy
+            j0[act] = j1
+            act = act[p[act, j1] != 0]
+        if not converged:
+            break
+
+        # flip the augmenting path
+        act = np.arange(B)
+        while act.size:
+            jj = j0[act]
+            j1 = way[act, jj]
+            p[act, jj] = p[act, j1]
+            j0[act] = j1
+            act = act[j1 != 0]
+
+    assign = np.full((B, n), -1, dtype=np.int64)
+    bi, cj = np.nonzero(p[:, 1:])
+    assign[bi, p[bi, cj + 1] - 1] = cj
+    if not converged:
+        _greedy_fill(benefit, assign)
+    return assign, converged
+
+
+def _greedy_fill(benefit: np.ndarray, assign: np.ndarray) -> None:
+    # row by row across the whole stack: each open row takes its best free column
+    B, n = assign.shape
+    taken = np.zeros((B, n), dtype=bool)
+    bi, ri = np.nonzero(assign >= 0)
+    taken[bi, assign[bi, ri]] = True
+    for i in range(n):
+        open_ = np.nonzero(assign[:, i] < 0)[0]
+        if not open_.size:
+            continue
+        vals = np.where(taken[open_], np.iinfo(np.int64).min, benefit[open_, i])
+        j = vals.argmax(axis=1)
+        assign[open_, i] = j
+        taken[open_, j] = True
+
+
+# ---------------------------
+# Solver (batching + incremental state)
+# ---------------------------
+
+
+@dataclass
+class SolveStats:
+    groups: int = 0
+    deferred: int = 0  # groups the budget ran out on before their costs were built
+    buckets: int = 0
+    build_s: float = 0.0
+    solve_s: float = 0.0
+    converged: bool = True
+
+
+class AssignmentSolver:
+    """
+    Holds groups and their current assignments.
+
+      solver.solve(groups)                   # full solve, returns {group: {part: member|None}}
+      solver.finish(group_id, part_id)       # part done; member gets credit, slot frees up
+      solver.drop(group_id, part_id)         # assignee can't do it; never offer it to them again
+      solver.resolve()                       # re-solve only the groups touched since
+
+    Each call is bounded by `budget_s`. Groups whose costs couldn't be built in
+    time keep their previous assignments and stay dirty for the next resolve();
+    rows the Hungarian didn't reach in time get a greedy fill.
+    """
+
+    def __init__(self, weights: Optional[Weights] = None, budget_s: float = 0.5):
+        self.weights = weights or Weights()
+        self.budget_s = budget_s
+        self.groups: Dict[str, Group] = {}
+        self.assignments: Dict[str, Dict[str, Optional[str]]] = {}
+        self._declined: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        self._dirty: Set[str] = set()
+        self.last = SolveStats()
+
+    # --- events ---
+
+    def solve(self, groups: List[Group]) -> Dict[str, Dict[str, Optional[str]]]:
+        for g in groups:
+            self.groups[g.id] = g
+        return self._solve([g.id for g in groups])
+
+    def finish(self, group_id: str, part_id: str) -> None:
+        g = self.groups[group_id]
+        member_id = self.assignments.get(group_id, {}).pop(part_id, None)
+        part = next((p for p in g.parts if p.id == part_id), None)
+        g.parts = [p for p in g.parts if p.id != part_id]
+        if part is not None and member_id is not None:
+            m = next(m for m in g.members if m.id == member_id)
+            m.contributions[part.kind] = m.contributions.get(part.kind, 0) + 1
+        self._dirty.add(group_id)
+
+    def drop(self, group_id: str, part_id: str) -> None:
+        member_id = self.assignments.get(group_id, {}).get(part_id)
+        if member_id is not None:
+            self._declined[group_id].add((part_id, member_id))
+            self.assignments[group_id][part_id] = None
+        self._dirty.add(group_id)
+
+    def add_part(self, group_id: str, part: Part) -> None:
+        self.groups[group_id].parts.append(part)
+        self._dirty.add(group_id)
+
+    def resolve(self) -> Dict[str, Dict[str, Optional[str]]]:
+        ids, self._dirty = sorted(self._dirty), set()
+        return self._solve(ids)
+
+    # --- internals ---
+
+    def _solve(self, group_ids: List[str]) -> Dict[str, Dict[str, Optional[str]]]:
+        stats = SolveStats(groups=len(group_ids))
+        t0 = time.perf_counter()
+        build_deadline = t0 + BUILD_SHARE * self.budget_s
+        solve_deadline = t0 + (1.0 - FINISH_SHARE) * self.budget_s
+
+        buckets: Dict[int, List[_Problem]] = defaultdict(list)
+        for done, gid in enumerate(group_ids):
+            if time.perf_counter() > build_deadline:
+                self._dirty.update(group_ids[done:])
+                stats.deferred = len(group_ids) - done
+                stats.converged = False
+                break
+            g = self.groups[gid]
+            current = {p: m for p, m in self.assignments.get(gid, {}).items() if m is not None}
+            prob = _build(g, self.weights, current, self._declined.get(gid, set()))
+            # round sizes up so a batch is a few big stacks, not many small ones
+            buckets[-(-prob.benefit.shape[0] // BUCKET) * BUCKET].append(prob)
+        stats.build_s = time.perf_counter() - t0
+        stats.buckets = len(buckets)
+
+        t0 = time.perf_counter()
+        out: Dict[str, Dict[str, Optional[str]]] = {}
+        for n, probs in sorted(buckets.items()):
+            benefit = np.stack([_pad(p, n) for p in probs])
+            assign, ok = hungarian_batch(benefit, solve_deadline)
+            stats.converged &= ok
+            out.update(_decode(probs, benefit, assign))
+        stats.solve_s = time.perf_counter() - t0
+
+        self.assignments.update(out)
+        self.last = stats
+        return out
+
+
+def _decode(probs: List[_Problem], benefit: np.ndarray, assign: np.ndarray) -> Dict[str, Dict[str, Optional[str]]]:
+    # a dummy slot means unassigned; so does a declined pair, which the solve
+    # only lands on when every other slot is taken
+    B, n = assign.shape
+    owner = np.full((B, n), -1, dtype=np.int64)
+    for b, p in enumerate(probs):
+        owner[b, : len(p.slot_member)] = p.slot_member
+    rows = np.arange(B)[:, None]
+    holder = owner[rows, assign]
+    holder[benefit[rows, np.arange(n)[None, :], assign] == DECLINED] = -1
+    out: Dict[str, Dict[str, Optional[str]]] = {}
+    for p, h in zip(probs, holder[:, : max((p.n_parts for p in probs), default=0)].tolist()):
+        out[p.group.id] = {part.id: p.member_ids[m] if m >= 0 else None for part, m in zip(p.group.parts, h)}
+    return out
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+
+
+KINDS = ["kick", "snare", "hi-hats", "keys", "bass", "vocal texture", "adlibs", "glitch", "pads", "claps"]
+
+
+def _random_group(rng: random.Random, gid: str, n_members: int, n_parts: int) -> Group:
+    members = [
+        Member(
+            id=f"{gid}/m{i}",
+            skills={k: rng.random() for k in KINDS},
+            contributions={k: rng.randint(0, 6) for k in rng.sample(KINDS, 3)},
+            load=rng.randint(0, 3),
+            capacity=rng.randint(1, 3),
+        )
+        for i in range(n_members)
+    ]
+    parts = [Part(id=f"{gid}/p{i}", project=f"{gid}/proj{i % 2}", kind=rng.choice(KINDS)) for i in range(n_parts)]
+    return Group(gid, members, parts)
+
+
+def _brute_force_check(rng: random.Random, trials: int = 200) -> None:
+    # tiny problems: compare the batched solve against exhaustive search
+    from itertools import permutations
+
+    probs = []
+    for _ in range(trials):
+        n = rng.randint(1, 6)
+        probs.append(np.array([[rng.randint(-2000, 2000) for _ in range(n)] for _ in range(n)], dtype=np.int64))
+    for n in range(1, 7):
+        same = [b for b in probs if b.shape[0] == n]
+        if not same:
+            continue
+        assign, ok = hungarian_batch(np.stack(same))
+        for b, a in zip(same, assign):
+            got = int(b[np.arange(n), a].sum())
+            best = max(int(b[np.arange(n), list(perm)].sum()) for perm in permutations(range(n)))
+            assert ok and got == best, (got, best, b)
+    print(f"hungarian matches brute force on {trials} random problems")
+
+
+def _edge_case_check() -> None:
+    # a heavily loaded member still gets the part; one who declined it doesn't
+    busy = Group("busy", [Member("y", {"keys": 0.0}, load=30, capacity=1)], [Part("p1", "proj", "keys")])
+    solver = AssignmentSolver()
+    assert solver.solve([busy]) == {"busy": {"p1": "y"}}
+    solver.drop("busy", "p1")
+    assert solver.resolve() == {"busy": {"p1": None}}
+    print("overloaded members are still assigned; declined pairs never are")
+
+
+def bench(n_groups: int, budget_s: float) -> None:
+    rng = random.Random(11)
+    _brute_force_check(rng)
+    _edge_case_check()
+
+    print(f"\nbudget {budget_s * 1e3:.0f} ms per solve")
+    print(f"{'members':>7} {'parts':>5} {'groups':>6} {'build ms':>9} {'solve ms':>9} {'us/group':>9} "
+          f"{'resolve ms':>10} {'exact':>5} {'deferred':>8}")
+    over = []
+    for n_members, n_parts in [(2, 3), (4, 6), (6, 10), (8, 14), (12, 20), (16, 28)]:
+        groups = [_random_group(rng, f"g{i}", n_members, n_parts) for i in range(n_groups)]
+        solver = AssignmentSolver(budget_s=budget_s)
+        t0 = time.perf_counter()
+        solver.solve(groups)
+        walls = [time.perf_counter() - t0]
+        full = solver.last
+
+        # someone finishes a part in 10% of groups and someone drops one in another 10%
+        for g in rng.sample(groups, n_groups // 10):
+            solver.finish(g.id, rng.choice(g.parts).id)
+        for g in rng.sample(groups, n_groups // 10):
+            solver.drop(g.id, rng.choice(g.parts).id)
+        t0 = time.perf_counter()
+        solver.resolve()
+        walls.append(time.perf_counter() - t0)
+        inc = solver.last
+
+        print(
+            f"{n_members:>7} {n_parts:>5} {n_groups:>6} {full.build_s * 1e3:>9.1f} {full.solve_s * 1e3:>9.1f} "
+            f"{(full.build_s + full.solve_s) * 1e6 / n_groups:>9.1f} {(inc.build_s + inc.solve_s) * 1e3:>10.1f} "
+            f"{'yes' if full.converged and inc.converged else 'no':>5} {full.deferred + inc.deferred:>8}"
+        )
+        if max(walls) > budget_s:
+            over.append(f"{n_members}x{n_parts}: {max(walls) * 1e3:.0f} ms")
+    if over:
+        print(f"over budget: {', '.join(over)}")
+    else:
+        print("every solve and resolve finished within budget")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="crowd·noise part assignment")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="solve latency by group size")
+    b.add_argument("--groups", type=int, default=2000)
+    b.add_argument("--budget", type=float, default=2.0, help="time budget per batch (seconds)")
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        bench(args.groups, args.budget)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
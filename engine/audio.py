@@ -0,0 +1,192 @@
+"""
+Shared audio helpers: wav i/o (stdlib `wave`, PCM only), framing, spectral
+building blocks (window, mel filterbank), resampling, and synthetic one-shots
+for the benchmarks.
+
+Everything inside the engine is mono float32 in [-1, 1] at SAMPLE_RATE.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import wave
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+
+SAMPLE_RATE = 44100
+
+
+def read_wav(path: Path) -> Tuple[np.ndarray, int]:
+    """Returns (mono float32 samples, sample rate)."""
+    with wave.open(str(path), "rb") as wf:
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        sr = wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    return pcm_to_float(raw, width, channels), sr
+
+
+def wav_info(path: Path) -> Tuple[int, int]:
+    """(n_samples, sample rate) without reading the audio."""
+    with wave.open(str(path), "rb") as wf:
+        return wf.getnframes(), wf.getframerate()
+
+
+def iter_wav(path: Path, block: int = 65536, start: int = 0, stop: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Mono float32 blocks of up to `block` samples from [start, stop); never loads the whole file."""
+    with wave.open(str(path), "rb") as wf:
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        total = wf.getnframes()
+        stop = total if stop is None else min(stop, total)
+        if start >= stop:
+            return
+        wf.setpos(start)
+        pos = start
+        while pos < stop:
+            n = min(block, stop - pos)
+            raw = wf.readframes(n)
+            if not raw:
+                break
+            pos += n
+            yield pcm_to_float(raw, width, channels)
+
+
+def file_hash(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for piece in iter(lambda: fh.read(chunk), b""):
+            h.update(piece)
+    return h.hexdigest()
+
+
+def pcm_to_float(raw: bytes, width: int, channels: int) -> np.ndarray:
+    if width == 1:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        v = np.where(v & 0x800000, v - 0x1000000, v)
+        x = v.astype(np.float32) / 8388608.0
+    elif width == 4:
+        x = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width: {width} bytes")
+    if channels > 1:
+        x = x[: len(x) - len(x) % channels].reshape(-1, channels).mean(axis=1)
+    return x
+
+
+def write_wav(path: Path, samples: np.ndarray, sr: int = SAMPLE_RATE) -> None:
+    """Writes 16-bit PCM; (n,) is mono, (n, 2) is stereo."""
+    x = np.asarray(samples, dtype=np.float32)
+    with open_wav_writer(path, 1 if x.ndim == 1 else x.shape[1], sr) as wf:
+        wf.writeframes(float_to_pcm16(x))
+
+
+def open_wav_writer(path: Path, channels: int, sr: int = SAMPLE_RATE) -> wave.Wave_write:
+    """16-bit PCM writer for streaming blocks in with `writeframes(float_to_pcm16(block))`."""
+    wf = wave.open(str(path), "wb")
+    wf.setnchannels(channels)
+    wf.setsampwidth(2)
+    wf.setframerate(sr)
+    return wf
+
+
+def float_to_pcm16(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def content_hash(samples: np.ndarray) -> str:
+    """Stable id for a clip's audio (not its container/metadata)."""
+    return hashlib.sha1(np.ascontiguousarray(samples, dtype=np.float32).tobytes()).hexdigest()
+
+
+def frame(x: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    """(n_frames, n_fft) view; the tail is zero-padded to a whole frame."""
+    if len(x) < n_fft:
+        x = np.pad(x, (0, n_fft - len(x)))
+    n_frames = 1 + -(-(len(x) - n_fft) // hop)
+    need = (n_frames - 1) * hop + n_fft
+    if need > len(x):
+        x = np.pad(x, (0, need - len(x)))
+    return np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop]
+
+
+@lru_cache(maxsize=8)
+def hann_window(n: int) -> np.ndarray:
+    return np.hanning(n).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sr: int, n_fft: int, n_mels: int) -> np.ndarray:
+    """(n_mels, n_fft // 2 + 1) triangular filters, htk mel scale."""
+
+    def hz_to_mel(f):
+        return 2595.0 * np.log10(1.0 + np.asarray(f) / 700.0)
+
+    def mel_to_hz(m):
+        return 700.0 * (10.0 ** (np.asarray(m) / 2595.0) - 1.0)
+
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    edges = mel_to_hz(np.linspace(hz_to_mel(30.0), hz_to_mel(sr / 2.0), n_mels + 2))
+    lo, mid, hi = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    up = (freqs[None, :] - lo) / (mid - lo)
+    down = (hi - freqs[None, :]) / (hi - mid)
+    return np.maximum(0.0, np.minimum(up, down)).astype(np.float32)
+
+
+def resample(x: np.ndarray, sr_in: int, sr_out: int = SAMPLE_RATE) -> np.ndarray:
+    """Band-limited (fft) resample; fine for clip-length audio, not for whole songs."""
+    if sr_in == sr_out or len(x) == 0:
+        return np.asarray(x, dtype=np.float32)
+    g = math.gcd(sr_in, sr_out)
+    up, down = sr_out // g, sr_in // g
+    # pad so the fft's circular wrap lands in silence, and to down * 2**k samples
+    # so both fft lengths factor into small primes (44.1k <-> 48k: 147 / 160)
+    pad = down * -(-1024 // down)  # whole number of output samples, no fractional shift
+    blocks = 1 << int(math.ceil(math.log2((len(x) + 2 * pad) / down)))
+    n_in, n_out = down * blocks, up * blocks
+    xp = np.zeros(n_in, dtype=np.float32)
+    xp[pad : pad + len(x)] = x
+    spec = np.fft.rfft(xp)
+    out = np.zeros(n_out // 2 + 1, dtype=spec.dtype)
+    m = min(len(spec), len(out))
+    out[:m] = spec[:m]
+    y = np.fft.irfft(out, n_out) * (n_out / n_in)
+    lo = pad // down * up
+    return y[lo : lo + int(round(len(x) * up / down))].astype(np.float32)
+
+
+def synth_clip(kind: str, rng: np.random.Generator, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Rough stand-ins for recorded one-shots (basketball kicks, pen-tap hats, ...)."""
+    dur = {"kick": 0.4, "snare": 0.3, "hi-hat": 0.12, "clap": 0.35, "keys": 0.9, "vocal": 1.2}[kind]
+    dur *= rng.uniform(0.6, 1.6)
+    t = np.arange(int(dur * sr)) / sr
+    noise = rng.standard_normal(len(t))
+    if kind == "kick":
+        f = rng.uniform(45, 70) + rng.uniform(80, 200) * np.exp(-t * 30)
+        x = np.sin(2 * np.pi * np.cumsum(f) / sr) * np.exp(-t * rng.uniform(6, 12))
+    elif kind == "snare":
+        x = (0.6 * noise + 0.5 * np.sin(2 * np.pi * rng.uniform(160, 240) * t)) * np.exp(-t * rng.uniform(14, 24))
+    elif kind == "hi-hat":
+        x = np.diff(noise, prepend=0.0) * np.exp(-t * rng.uniform(30, 60))
+    elif kind == "clap":
+        env = sum(np.exp(-np.maximum(t - d, 0) * 60) * (t >= d) for d in (0.0, 0.012, 0.024))
+        x = noise * env * np.exp(-t * 8)
+    elif kind == "keys":
+        f0 = 220.0 * 2 ** (rng.integers(0, 24) / 12.0)
+        x = sum(np.sin(2 * np.pi * f0 * h * t) / h**1.5 for h in range(1, 6)) * np.exp(-t * rng.uniform(2, 4))
+    else:  # vocal-ish: vibrato + a couple of formant-y harmonics, slow attack
+        f0 = rng.uniform(110, 300) * (1 + 0.01 * np.sin(2 * np.pi * 5.5 * t))
+        ph = 2 * np.pi * np.cumsum(f0) / sr
+        x = (np.sin(ph) + 0.5 * np.sin(2 * ph) + 0.3 * np.sin(3 * ph)) * np.minimum(t / 0.08, 1.0) + 0.02 * noise
+    x = x * rng.uniform(0.3, 0.9) / (np.abs(x).max() + 1e-9)
+    return x.astype(np.float32)
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Clip analysis: compact feature vectors + a nearest-neighbour index over the
+shared sample library, so clips can be auto-tagged (kick / snare / hi-hat / ...)
+and "find me something that works as a snare" is one matrix-vector product.
+
+Features are computed for whole batches of clips at once: every clip's STFT
+frames are stacked into one matrix, per-frame features are plain numpy ops over
+that matrix, and per-clip stats come back out with reduceat over the clip
+boundaries. Vectors are cached on disk by content hash; ingest fans out over a
+process pool.
+
+Needs numpy.
+
+run:
+
+    python3 -m engine.features bench --clips 3000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, content_hash, frame, hann_window, mel_filterbank, read_wav, synth_clip, write_wav
+
+
+FEATURE_VERSION = 1  # bump when the vector layout changes; old cache entries are ignored
+N_FFT = 1024
+HOP = 256
+N_MELS = 40
+N_MFCC = 13
+FRAME_BLOCK = 256  # frames per FFT block inside a batch (keeps spectra cache-sized)
+
+FEATURE_NAMES = (
+    ["log_duration", "rms_mean", "rms_peak", "centroid_mean", "centroid_std", "flatness_mean", "flatness_std"]
+    + ["onset_peak", "onset_mean", "attack_s", "decay_s"]
+    + [f"mfcc{i}_mean" for i in range(N_MFCC)]
+    + [f"mfcc{i}_std" for i in range(N_MFCC)]
+)
+DIM = len(FEATURE_NAMES)
+
+
+# ---------------------------
+# DCT
+# ---------------------------
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n_out: int = N_MFCC, n_in: int = N_MELS) -> np.ndarray:
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    m = np.cos(np.pi / n_in * (n + 0.5) * k) * np.sqrt(2.0 / n_in)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+# ---------------------------
+# Batched extraction
+# ---------------------------
+
+
+def _segment_argmax(values: np.ndarray, seg: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Index (relative to each segment start) of the max value per segment."""
+    order = np.lexsort((-values, seg))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = seg[order[1:]] != seg[order[:-1]]
+    return order[first] - starts
+
+
+def _frame_features(frames: np.ndarray, sr: int) -> Tuple[np.ndarray, ...]:
+    """(rms, centroid kHz, flatness, log-mel, mfcc) for a (T, N_FFT) block of frames."""
+    tiny = 1e-10
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    spec = np.fft.rfft(frames * hann_window(N_FFT), axis=1)
+    spec = (spec.real * spec.real + spec.imag * spec.imag).astype(np.float32)  # (T, bins) power
+    power = spec.sum(axis=1) + tiny
+
+    freqs = np.fft.rfftfreq(N_FFT, 1.0 / sr).astype(np.float32)
+    centroid = (spec @ freqs) / power / 1000.0
+    flatness = np.exp(np.mean(np.log(spec + tiny), axis=1)) / (power / spec.shape[1])
+
+    logmel = np.log(spec @ mel_filterbank(sr, N_FFT, N_MELS).T + tiny)
+    mfcc = logmel @ _dct_matrix().T
+    return rms, centroid, flatness, logmel, mfcc
+
+
+def extract_batch(clips: Sequence[np.ndarray], sr: int = SAMPLE_RATE) -> np.ndarray:
+    """(len(clips), DIM) float32 feature matrix."""
+    if not clips:
+        return np.zeros((0, DIM), dtype=np.float32)
+
+    framed = [frame(np.asarray(x, dtype=np.float32), N_FFT, HOP) for x in clips]
+    counts = np.array([len(f) for f in framed])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    seg = np.repeat(np.arange(len(clips)), counts)
+    frames = np.concatenate(framed)  # (T, N_FFT)
+
+    # per-frame features, a block of frames at a time so the spectra stay in cache
+    per_frame = [_frame_features(frames[i : i + FRAME_BLOCK], sr) for i in range(0, len(frames), FRAME_BLOCK)]
+    rms, centroid, flatness, logmel, mfcc = (np.concatenate(cols) for cols in zip(*per_frame))
+
+    # onset envelope: half-wave rectified log-mel flux (no flux across clip boundaries)
+    flux = np.empty_like(logmel)
+    flux[1:] = logmel[1:] - logmel[:-1]
+    flux[starts] = 0.0
+    onset = np.maximum(flux, 0.0).mean(axis=1)
+
+    def seg_mean(x: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(x, starts, axis=0) / (counts if x.ndim == 1 else counts[:, None])
+
+    def seg_std(x: np.ndarray) -> np.ndarray:
+        m = seg_mean(x)
+        return np.sqrt(np.maximum(seg_mean(x * x) - m * m, 0.0))
+
+    log_rms = np.log(rms + 1e-6)
+    peak_rms = np.maximum.reduceat(log_rms, starts)
+    peak_at = _segment_argmax(log_rms, seg, starts)
+    # decay: frames spent within 20 dB (~2.3 nats) of the peak
+    loud = (log_rms >= peak_rms[seg] - 2.3).astype(np.float32)
+
+    sec_per_frame = HOP / float(sr)
+    durations = np.array([len(x) for x in clips], dtype=np.float32) / sr
+
+    out = np.column_stack(
+        [
+            np.log(durations + 1e-3),
+            seg_mean(log_rms),
+            peak_rms,
+            seg_mean(centroid),
+            seg_std(centroid),
+            seg_mean(flatness),
+            seg_std(flatness),
+            np.maximum.reduceat(onset, starts),
+            seg_mean(onset),
+            peak_at * sec_per_frame,
+            np.add.reduceat(loud, starts) * sec_per_frame,
+            seg_mean(mfcc),
+            seg_std(mfcc),
+        ]
+    )
+    return out.astype(np.float32)
+
+
+def extract(clip: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    return extract_batch([clip], sr)[0]
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+
+
+class FeatureCache:
+    """
+    One .npy per clip under `root/<hash[:2]>/`, keyed by content hash, sample
+    rate (the same samples at another rate are different audio) and
+    FEATURE_VERSION.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._mem: Dict[Tuple[str, int], np.ndarray] = {}
+
+    def _path(self, key: str, sr: int) -> Path:
+        return self.root / key[:2] / f"{key}.{sr}.v{FEATURE_VERSION}.npy"
+
+    def get(self, key: str, sr: int) -> Optional[np.ndarray]:
+        vec = self._mem.get((key, sr))
+        if vec is not None:
+            return vec
+        path = self._path(key, sr)
+        if not path.exists():
+            return None
+        try:
+            vec = np.load(path)
+        except (OSError, ValueError):
+            return None
+        if vec.shape != (DIM,):
+            return None
+        self._mem[(key, sr)] = vec
+        return vec
+
+    def put(self, key: str, sr: int, vec: np.ndarray) -> None:
+        self._mem[(key, sr)] = vec
+        path = self._path(key, sr)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write-then-rename so concurrent workers never see half a file
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as fh:
+            np.save(fh, vec)
+        os.replace(tmp, path)
+
+
+# ---------------------------
+# Parallel ingest
+# ---------------------------
+
+
+@dataclass
+class ClipFeatures:
+    path: str
+    hash: str
+    vector: np.ndarray
+    cached: bool
+
+
+def _ingest_chunk(paths: List[str], cache_dir: str) -> List[ClipFeatures]:
+    cache = FeatureCache(Path(cache_dir))
+    out: List[ClipFeatures] = []
+    todo: Dict[int, List[Tuple[str, str, np.ndarray]]] = {}
+    for p in paths:
+        x, sr = read_wav(Path(p))
+        key = content_hash(x)
+        vec = cache.get(key, sr)
+        if vec is not None:
+            out.append(ClipFeatures(p, key, vec, cached=True))
+        else:
+            todo.setdefault(sr, []).append((p, key, x))
+    for sr, items in todo.items():
+        vecs = extract_batch([x for _, _, x in items], sr)
+        for (p, key, _), vec in zip(items, vecs):
+            cache.put(key, sr, vec)
+            out.append(ClipFeatures(p, key, vec, cached=False))
+    return out
+
+
+def ingest(paths: Iterable[Path], cache_dir: Path, workers: Optional[int] = None, chunk: int = 64) -> List[ClipFeatures]:
+    """Feature vectors for every wav in `paths`, computed across `workers` processes."""
+    paths = [str(p) for p in paths]
+    chunks = [paths[i : i + chunk] for i in range(0, len(paths), chunk)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        return [cf for c in chunks for cf in _ingest_chunk(c, str(cache_dir))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_ingest_chunk, chunks, [str(cache_dir)] * len(chunks))
+        return [cf for r in results for cf in r]
+
+
+# ---------------------------
+# Nearest-neighbour index
+# ---------------------------
+
+
+class SampleIndex:
+    """
+    Cosine kNN over standardized feature vectors. Small enough libraries
+    (hundreds of thousands of clips) are one dense matmul per query.
+
+    Vectors live in a growable matrix, so `add` is amortized O(DIM).
+    Standardization stats are refit (and the matrix re-normalized) only when
+    the library has doubled since the last fit; clips added in between are
+    normalized with the frozen stats.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.labels: List[Optional[str]] = []
+        self._row: Dict[str, int] = {}
+        self._raw = np.zeros((16, DIM), dtype=np.float32)
+        self._z = np.zeros((16, DIM), dtype=np.float32)
+        self._label_code = np.full(16, -1, dtype=np.int64)  # -1 = unlabeled
+        self._label_names: List[str] = []
+        self._label_of: Dict[str, int] = {}
+        self._mu = np.zeros(DIM, dtype=np.float32)
+        self._sd = np.ones(DIM, dtype=np.float32)
+        self._fitted = 0  # library size at the last fit
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, clip_id: str, vector: np.ndarray, label: Optional[str] = None) -> None:
+        """Add a clip, or replace its vector and label if the id is already indexed."""
+        row = self._row.get(clip_id)
+        if row is not None:
+            self.labels[row] = label
+            self._raw[row] = vector
+            self._label_code[row] = self._code(label)
+            self._z[row] = self._normalize(self._raw[row])
+            return
+        n = len(self.ids)
+        if n == len(self._raw):
+            self._raw = np.concatenate([self._raw, np.zeros_like(self._raw)])
+            self._z = np.concatenate([self._z, np.zeros_like(self._z)])
+            self._label_code = np.concatenate([self._label_code, np.full(n, -1, dtype=np.int64)])
+        self.ids.append(clip_id)
+        self.labels.append(label)
+        self._row[clip_id] = n
+        self._raw[n] = vector
+        self._label_code[n] = self._code(label)
+        if n + 1 >= 2 * self._fitted:
+            self.fit()
+        else:
+            self._z[n] = self._normalize(self._raw[n])
+
+    def _code(self, label: Optional[str]) -> int:
+        if not label:
+            return -1
+        code = self._label_of.get(label)
+        if code is None:
+            code = self._label_of[label] = len(self._label_names)
+            self._label_names.append(label)
+        return code
+
+    def fit(self) -> None:
+        """Refit standardization stats to the whole library and re-normalize it."""
+        n = len(self.ids)
+        x = self._raw[:n]
+        if n:
+            self._mu = x.mean(axis=0)
+            self._sd = x.std(axis=0) + 1e-6
+        self._z[:n] = self._normalize(x)
+        self._fitted = n
+
+    def _normalize(self, x: np.ndarray) -> np.ndarray:
+        z = (x - self._mu) / self._sd
+        return (z / (np.linalg.norm(z, axis=-1, keepdims=True) + 1e-9)).astype(np.float32)
+
+    def _sims(self, vector: np.ndarray) -> np.ndarray:
+        return self._z[: len(self.ids)] @ self._normalize(np.asarray(vector, dtype=np.float32))
+
+    def _top(self, sims: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(sims))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return top[np.isfinite(sims[top])]
+
+    def query(self, vector: np.ndarray, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        if not self.ids:
+            return []
+        sims = self._sims(vector)
+        if exclude is not None and exclude in self._row:
+            sims[self._row[exclude]] = -np.inf
+        return [(self.ids[i], float(sims[i])) for i in self._top(sims, k)]
+
+    def classify(self, vector: np.ndarray, k: int = 7) -> Tuple[Optional[str], float]:
+        """(label, share of similarity-weighted votes) from the k nearest labeled clips."""
+        if not self.ids or not self._label_names:
+            return None, 0.0
+        codes = self._label_code[: len(self.ids)]
+        sims = np.where(codes >= 0, self._sims(vector), -np.inf)
+        top = self._top(sims, k)
+        if not len(top):
+            return None, 0.0
+        votes = np.bincount(codes[top], weights=np.maximum(sims[top], 0.0), minlength=len(self._label_names))
+        best = int(votes.argmax())
+        return self._label_names[best], float(votes[best] / (votes.sum() or 1.0))
+
+    def find(self, kind: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Clips that would work as `kind`: nearest to the centroid of everything tagged `kind`."""
+        code = self._label_of.get(kind)
+        if code is None:
+            return []
+        z = self._z[: len(self.ids)]
+        proto = z[self._label_code[: len(self.ids)] == code].mean(axis=0)
+        sims = z @ (proto / (np.linalg.norm(proto) + 1e-9))
+        return [(self.ids[i], float(sims[i])) for i in self._top(sims, k)]
+
+
+# ---------------------------
+# Benchmark (synthetic library)
+# ---------------------------
+
+
+KINDS = ["kick", "snare", "hi-hat", "clap", "keys", "vocal"]
+
+
+def bench(n_clips: int, workers: Optional[int]) -> None:
+    rng = np.random.default_rng(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        clip_dir, cache_dir = tmp / "clips", tmp / "cache"
+        clip_dir.mkdir()
+        labels: Dict[str, str] = {}
+        for i in range(n_clips):
+            kind = KINDS[i % len(KINDS)]
+            path = clip_dir / f"{i:05d}.wav"
+            write_wav(path, synth_clip(kind, rng))
+            labels[str(path)] = kind
+        paths = sorted(clip_dir.glob("*.wav"))
+        total_s = sum(path.stat().st_size for path in paths) / (2 * SAMPLE_RATE)
+        print(f"{n_clips:,} clips, {total_s:.0f}s of audio, workers={workers or os.cpu_count()}")
+
+        t0 = time.perf_counter()
+        feats = ingest(paths, cache_dir, workers)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        again = ingest(paths, cache_dir, workers)
+        warm = time.perf_counter() - t0
+        print(f"ingest cold: {cold:.2f}s ({n_clips / cold:,.0f} clips/s, {total_s / cold:,.0f}x realtime)")
+        print(f"ingest warm: {warm:.2f}s ({sum(cf.cached for cf in again):,} cache hits)")
+
+        # batch vs one-at-a-time, same process
+        sample = [synth_clip(KINDS[i % len(KINDS)], rng) for i in range(300)]
+        extract_batch(sample[:10])
+        t0 = time.perf_counter()
+        extract_batch(sample)
+        batched = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for x in sample:
+            extract(x)
+        single = time.perf_counter() - t0
+        print(f"extract 300 clips: batched {batched * 1e3:.0f}ms vs one-by-one {single * 1e3:.0f}ms")
+
+        # the upload loop: tag each new clip against the library so far, then add it
+        index = SampleIndex()
+        tagged = 0
+        t0 = time.perf_counter()
+        for cf in feats:
+            guess, _ = index.classify(cf.vector)
+            tagged += guess == labels[cf.path]
+            index.add(cf.path, cf.vector, labels[cf.path])
+        per_upload = (time.perf_counter() - t0) / len(feats)
+        print(f"classify + add per upload: {per_upload * 1e3:.3f}ms ({tagged / len(feats):.1%} tagged right as they arrived)")
+
+        # leave-one-out auto-tagging accuracy
+        correct = 0
+        t0 = time.perf_counter()
+        n_eval = min(600, len(feats))
+        for cf in feats[:n_eval]:
+            neighbours = [cid for cid, _ in index.query(cf.vector, k=7, exclude=cf.path)]
+            guess = Counter(labels[c] for c in neighbours).most_common(1)[0][0]
+            correct += guess == labels[cf.path]
+        per_query = (time.perf_counter() - t0) / n_eval
+        print(f"auto-tag (7-nn, leave-one-out): {correct / n_eval:.1%} over {n_eval} clips, {per_query * 1e3:.2f}ms/query")
+
+        t0 = time.perf_counter()
+        hits = index.find("snare", k=10)
+        print(f"find('snare'): {(time.perf_counter() - t0) * 1e3:.2f}ms -> "
+              + ", ".join(f"{labels[c]}" for c, _ in hits))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="crowd·noise clip features")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="ingest + auto-tag a synthetic library")
+    b.add_argument("--clips", type=int, default=3000)
+    b.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        bench(args.clips, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
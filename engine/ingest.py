@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+Clip ingest: "record/upload micro-clips + trim fast", at burst scale.
+
+  upload (chunked, resumable) -> spool/
+    -> hash      hash of the uploaded bytes; a byte-identical re-upload stops
+                 here and reuses the first result
+    -> process   decode, resample to the house format (mono, SAMPLE_RATE),
+                 trim silence, normalize loudness (BS.1770 LUFS)
+                 -> library/<clip id>.wav
+    -> commit    append to library/index.jsonl
+
+The clip id is `audio.content_hash` of the house-format samples, the same id
+the mixer's ClipStore and the feature cache use for that audio. So the same
+recording sent as dual-mono stereo or in another container still lands on
+one library entry (duplicate=True for the later uploads).
+
+Stages are connected by bounded asyncio queues, so a burst of uploads
+backs up into `submit()` instead of piling up in memory. Processing runs on a
+bounded process pool with one in-flight job per worker.
+
+Needs numpy.
+
+run:
+
+    python3 -m engine.ingest bench --clips 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, content_hash, file_hash, float_to_pcm16, frame, open_wav_writer, pcm_to_float, read_wav, resample
+from .jsonl import read_jsonl
+from .stats import pct
+
+
+TARGET_LUFS = -16.0
+PEAK_CEILING_DB = -1.0
+SILENCE_DB = -50.0  # frames this far under the clip's peak count as silence
+TRIM_PAD_S = 0.01
+FADE_S = 0.005
+
+
+# ---------------------------
+# Resumable upload spool
+# ---------------------------
+
+
+_UPLOAD_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class UploadSpool:
+    """
+    Uploads land in `<root>/<id>.part` and are renamed to `<id>.upload` when
+    complete. A client that drops out asks `received(id)` (or calls `begin` again)
+    and resumes from that offset.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _part(self, upload_id: str) -> Path:
+        if not _UPLOAD_ID.match(upload_id):
+            raise ValueError(f"bad upload id: {upload_id!r}")
+        return self.root / f"{upload_id}.part"
+
+    def _meta(self, upload_id: str) -> Path:
+        return self.root / f"{upload_id}.json"
+
+    def begin(self, upload_id: str, size: Optional[int] = None) -> int:
+        """Start (or resume) an upload; returns the offset to send from."""
+        part = self._part(upload_id)
+        if not part.exists():
+            part.touch()
+            self._meta(upload_id).write_text(json.dumps({"size": size, "created": time.time()}), encoding="utf-8")
+        return part.stat().st_size
+
+    def received(self, upload_id: str) -> int:
+        part = self._part(upload_id)
+        return part.stat().st_size if part.exists() else 0
+
+    def write(self, upload_id: str, offset: int, data: bytes) -> int:
+        """
+        Write a chunk at `offset`; returns the new received size. Re-sending
+        an earlier chunk is fine (it overwrites); skipping ahead is an error.
+        """
+        part = self._part(upload_id)
+        have = part.stat().st_size if part.exists() else 0
+        if offset > have:
+            raise ValueError(f"{upload_id}: chunk at {offset} but only {have} bytes received")
+        with part.open("r+b" if part.exists() else "wb") as fh:
+            fh.seek(offset)
+            fh.write(data)
+            fh.truncate(offset + len(data))
+        return offset + len(data)
+
+    def complete(self, upload_id: str) -> Path:
+        part = self._part(upload_id)
+        meta_path = self._meta(upload_id)
+        size = json.loads(meta_path.read_text(encoding="utf-8")).get("size") if meta_path.exists() else None
+        have = part.stat().st_size
+        if size is not None and have != size:
+            raise ValueError(f"{upload_id}: expected {size} bytes, have {have}")
+        done = part.with_suffix(".upload")
+        os.replace(part, done)
+        meta_path.unlink(missing_ok=True)
+        return done
+
+    def discard(self, upload_id: str) -> None:
+        for p in (self._part(upload_id), self._part(upload_id).with_suffix(".upload"), self._meta(upload_id)):
+            p.unlink(missing_ok=True)
+
+
+# ---------------------------
+# Loudness (BS.1770) + trimming
+# ---------------------------
+
+
+@lru_cache(maxsize=8)
+def _k_weighting(sr: int, n_fft: int) -> np.ndarray:
+    """|H|^2 of the BS.1770 K-weighting (shelf + high-pass biquads) at rfft bins."""
+    z = np.exp(-1j * 2 * np.pi * np.fft.rfftfreq(n_fft, 1.0 / sr) / sr)
+
+    def biquad(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+    # high shelf: +4 dB above ~1.5 kHz
+    A, w0, q = 10 ** (4.0 / 40.0), 2 * np.pi * 1500.0 / sr, 1 / np.sqrt(2)
+    alpha, cw, sa = np.sin(w0) / (2 * q), np.cos(w0), np.sqrt(A)
+    shelf = biquad(
+        (A * ((A + 1) + (A - 1) * cw + 2 * sa * alpha), -2 * A * ((A - 1) + (A + 1) * cw), A * ((A + 1) + (A - 1) * cw - 2 * sa * alpha)),
+        ((A + 1) - (A - 1) * cw + 2 * sa * alpha, 2 * ((A - 1) - (A + 1) * cw), (A + 1) - (A - 1) * cw - 2 * sa * alpha),
+    )
+    # high pass at 38 Hz
+    w0, q = 2 * np.pi * 38.0 / sr, 0.5
+    alpha, cw = np.sin(w0) / (2 * q), np.cos(w0)
+    hp = biquad(((1 + cw) / 2, -(1 + cw), (1 + cw) / 2), (1 + alpha, -2 * cw, 1 - alpha))
+    return (np.abs(shelf * hp) ** 2).astype(np.float64)
+
+
+def loudness_lufs(x: np.ndarray, sr: int = SAMPLE_RATE) -> float:
+    """
+    Integrated loudness of a mono clip: K-weighting (applied as a magnitude
+    response in the frequency domain), 400 ms blocks at 75% overlap, absolute
+    gate at -70 LUFS, relative gate 10 LU down. Clips under one block are
+    measured as a single block. -inf for silence.
+    """
+    if len(x) == 0:
+        return float("-inf")
+    n_fft = 1 << int(np.ceil(np.log2(len(x) + 1024)))
+    # |H|^2 on the power spectrum == energy of the filtered signal per bin; go
+    # back to time domain via sqrt so the gating blocks see filtered samples
+    spec = np.fft.rfft(x, n_fft) * np.sqrt(_k_weighting(sr, n_fft))
+    y = np.fft.irfft(spec, n_fft)[: len(x)]
+
+    block, hop = int(0.4 * sr), int(0.1 * sr)
+    sq = np.concatenate([[0.0], np.cumsum(y * y)])
+    if len(y) <= block:
+        ms = np.array([sq[-1] / len(y)])
+    else:
+        starts = np.arange(0, len(y) - block + 1, hop)
+        ms = (sq[starts + block] - sq[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        lk = -0.691 + 10.0 * np.log10(ms)
+    ms = ms[lk > -70.0]
+    if not len(ms):
+        return float("-inf")
+    rel = -0.691 + 10.0 * np.log10(ms.mean()) - 10.0
+    with np.errstate(divide="ignore"):
+        ms = ms[-0.691 + 10.0 * np.log10(ms) > rel]
+    return float(-0.691 + 10.0 * np.log10(ms.mean()))
+
+
+def trim_silence(x: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Drop leading/trailing frames more than SILENCE_DB under the peak frame; short fades at the cuts."""
+    if len(x) == 0:
+        return x
+    n_fft, hop = 512, 128
+    rms = np.sqrt(np.mean(frame(x, n_fft, hop) ** 2, axis=1))
+    peak = rms.max()
+    if peak <= 0:
+        return x[:0]
+    loud = np.nonzero(rms >= peak * 10 ** (SILENCE_DB / 20.0))[0]
+    pad = int(TRIM_PAD_S * sr)
+    a = max(0, loud[0] * hop - pad)
+    b = min(len(x), loud[-1] * hop + n_fft + pad)
+    y = x[a:b].copy()
+    fade = min(int(FADE_S * sr), len(y) // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        y[:fade] *= ramp if a > 0 else 1.0
+        y[-fade:] *= ramp[::-1] if b < len(x) else 1.0
+    return y
+
+
+# ---------------------------
+# Processing (runs in the worker pool)
+# ---------------------------
+
+
+def process_clip(src: str, library: str, target_lufs: float = TARGET_LUFS) -> dict:
+    """
+    decode -> resample -> trim -> normalize -> write `library/<clip id>.wav`.
+    Returns stats, the clip id and per-step timings.
+    """
+    t = {}
+    t0 = time.perf_counter()
+    x, sr = read_wav(Path(src))
+    t["decode"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    x = resample(x, sr, SAMPLE_RATE)
+    t["resample"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    before = len(x)
+    x = trim_silence(x)
+    t["trim"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    lufs_in = loudness_lufs(x)
+    out = {"source_sr": sr, "trimmed_s": (before - len(x)) / SAMPLE_RATE, "lufs_in": lufs_in, "timings": t}
+    if not np.isfinite(lufs_in):
+        t["normalize"] = time.perf_counter() - t0
+        out.update(error="silent", clip_id="", path=None, duration_s=0.0, lufs_out=lufs_in, limited=False)
+        return out
+    x = x * np.float32(10 ** ((target_lufs - lufs_in) / 20.0))
+    peak = float(np.abs(x).max())
+    ceiling = 10 ** (PEAK_CEILING_DB / 20.0)
+    limited = peak > ceiling
+    if limited:
+        # quiet transient-heavy clips can't reach the target without clipping;
+        # keep the peak and accept coming in under target
+        x *= np.float32(ceiling / peak)
+    t["normalize"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    # the id is taken from the samples as they'll read back from disk
+    pcm = float_to_pcm16(x)
+    x = pcm_to_float(pcm, 2, 1)
+    clip_id = content_hash(x)
+    dst = Path(library) / f"{clip_id}.wav"
+    if not dst.exists():
+        tmp = dst.with_name(f"{dst.name}.{os.getpid()}.tmp")
+        with open_wav_writer(tmp, 1, SAMPLE_RATE) as wf:
+            wf.writeframes(pcm)
+        os.replace(tmp, dst)
+    t["write"] = time.perf_counter() - t0
+
+    out.update(clip_id=clip_id, path=str(dst), duration_s=len(x) / SAMPLE_RATE, lufs_out=loudness_lufs(x), limited=limited, error=None)
+    return out
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+
+
+@dataclass
+class IngestResult:
+    upload_id: str
+    hash: str  # clip id: content_hash of the house-format audio ("" if it failed)
+    path: Optional[str]
+    upload_hash: str = ""  # file_hash of the uploaded bytes
+    duplicate: bool = False
+    duration_s: float = 0.0
+    lufs_in: float = float("-inf")
+    lufs_out: float = float("-inf")
+    trimmed_s: float = 0.0
+    limited: bool = False
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)  # stage -> seconds
+
+
+@dataclass
+class _Job:
+    upload_id: str
+    src: Path
+    future: asyncio.Future
+    submitted: float
+    marks: Dict[str, float] = field(default_factory=dict)
+    upload_hash: str = ""
+
+
+class IngestService:
+    """
+      svc = IngestService(root, workers=4)
+      await svc.start()
+      ... spool uploads via svc.spool ...
+      result = await (await svc.submit(upload_id))
+      await svc.stop()
+    """
+
+    def __init__(self, root: Path, workers: Optional[int] = None, queue_size: int = 32, target_lufs: float = TARGET_LUFS):
+        self.root = Path(root)
+        self.spool = UploadSpool(self.root / "spool")
+        self.library = self.root / "library"
+        self.library.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.library / "index.jsonl"
+        self.workers = workers or os.cpu_count() or 1
+        self.target_lufs = target_lufs
+        self._hash_q: asyncio.Queue = asyncio.Queue(queue_size)
+        self._proc_q: asyncio.Queue = asyncio.Queue(queue_size)
+        self._known: Dict[str, IngestResult] = {}  # clip id -> first result
+        self._uploads: Dict[str, IngestResult] = {}  # upload hash -> result for those bytes
+        self._inflight: Dict[str, List[_Job]] = {}  # upload hash -> jobs waiting on it
+        self._tasks: List[asyncio.Task] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._index_fh = None
+        self._load_index()
+
+    def _load_index(self) -> None:
+        # a torn last line (crash mid-write) is cut off here, before start() appends
+        for rec in read_jsonl(self.index_path):
+            result = IngestResult(**rec)
+            if result.upload_hash:
+                self._uploads[result.upload_hash] = result
+            if result.hash and not result.duplicate:
+                self._known.setdefault(result.hash, result)
+
+    async def start(self) -> None:
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._index_fh = self.index_path.open("a", encoding="utf-8")
+        self._tasks = [asyncio.create_task(self._hash_stage()) for _ in range(2)]
+        # one task per worker: the pool never has more queued than it can run,
+        # so back-pressure shows up in _proc_q instead of inside the executor
+        self._tasks += [asyncio.create_task(self._process_stage()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        await self._hash_q.join()
+        await self._proc_q.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self._index_fh is not None:
+            self._index_fh.close()
+
+    async def submit(self, upload_id: str) -> "asyncio.Future[IngestResult]":
+        """Finish a spooled upload and queue it. Waits while the pipeline is full."""
+        src = self.spool.complete(upload_id)
+        loop = asyncio.get_running_loop()
+        job = _Job(upload_id, src, loop.create_future(), submitted=time.perf_counter())
+        await self._hash_q.put(job)
+        return job.future
+
+    # --- stages ---
+
+    async def _hash_stage(self) -> None:
+        while True:
+            job = await self._hash_q.get()
+            try:
+                job.marks["hash_start"] = time.perf_counter()
+                job.upload_hash = await asyncio.to_thread(file_hash, job.src)
+                job.marks["hash_end"] = time.perf_counter()
+                known = self._uploads.get(job.upload_hash)
+                if known is not None:
+                    self._finish_duplicate(job, known)
+                elif job.upload_hash in self._inflight:
+                    self._inflight[job.upload_hash].append(job)
+                else:
+                    self._inflight[job.upload_hash] = []
+                    await self._proc_q.put(job)
+            except Exception as exc:  # keep the stage alive; the caller sees the error
+                job.src.unlink(missing_ok=True)
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            finally:
+                self._hash_q.task_done()
+
+    async def _process_stage(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._proc_q.get()
+            try:
+                job.marks["process_start"] = time.perf_counter()
+                stats = await loop.run_in_executor(self._pool, process_clip, str(job.src), str(self.library), self.target_lufs)
+                job.marks["process_end"] = time.perf_counter()
+                result = IngestResult(
+                    upload_id=job.upload_id,
+                    hash=stats["clip_id"],
+                    path=stats["path"],
+                    upload_hash=job.upload_hash,
+                    duration_s=stats["duration_s"],
+                    lufs_in=stats["lufs_in"],
+                    lufs_out=stats["lufs_out"],
+                    trimmed_s=stats["trimmed_s"],
+                    limited=stats["limited"],
+                    error=stats["error"],
+                )
+                self._commit(job, result, stats["timings"])
+            except Exception as exc:
+                waiting = self._inflight.pop(job.upload_hash, [])
+                for j in [job] + waiting:
+                    j.src.unlink(missing_ok=True)
+                    if not j.future.done():
+                        j.future.set_exception(exc)
+            finally:
+                job.src.unlink(missing_ok=True)
+                self._proc_q.task_done()
+
+    def _commit(self, job: _Job, result: IngestResult, worker_timings: Dict[str, float]) -> None:
+        first = self._known.get(result.hash) if result.hash else None
+        if first is not None:
+            # different bytes, same audio once in the house format
+            result = IngestResult(**{**asdict(first), "upload_id": job.upload_id, "upload_hash": job.upload_hash, "duplicate": True})
+        elif result.hash:
+            self._known[result.hash] = result
+        self._uploads[job.upload_hash] = result
+        rec = asdict(result)
+        rec.pop("timings")
+        self._index_fh.write(json.dumps(rec) + "\n")
+        self._index_fh.flush()
+
+        m = job.marks
+        result.timings = {
+            "queue:hash": m["hash_start"] - job.submitted,
+            "hash": m["hash_end"] - m["hash_start"],
+            "queue:process": m["process_start"] - m["hash_end"],
+            **worker_timings,
+            "total": m["process_end"] - job.submitted,
+        }
+        if not job.future.done():
+            job.future.set_result(result)
+        for dup in self._inflight.pop(job.upload_hash, []):
+            self._finish_duplicate(dup, result)
+
+    def _finish_duplicate(self, job: _Job, known: IngestResult) -> None:
+        job.src.unlink(missing_ok=True)
+        now = time.perf_counter()
+        timings = {
+            "queue:hash": job.marks["hash_start"] - job.submitted,
+            "hash": job.marks["hash_end"] - job.marks["hash_start"],
+            "total": now - job.submitted,
+        }
+        result = IngestResult(**{**asdict(known), "upload_id": job.upload_id, "upload_hash": job.upload_hash, "duplicate": True, "timings": timings})
+        if not job.future.done():
+            job.future.set_result(result)
+
+
+# ---------------------------
+# Load generator
+# ---------------------------
+
+
+def _wav_bytes(x: np.ndarray, sr: int, channels: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(float_to_pcm16(np.repeat(x[:, None], channels, axis=1) if channels > 1 else x))
+    return buf.getvalue()
+
+
+def _phone_clip(rng: np.random.Generator) -> Tuple[np.ndarray, int]:
+    """A 0.1-10 s recording: some sound, silence either side, any level/rate a phone might send."""
+    sr = int(rng.choice([22050, 44100, 48000]))
+    dur = float(np.exp(rng.uniform(np.log(0.1), np.log(10.0))))
+    n = int(dur * sr)
+    t = np.arange(n) / sr
+    body = rng.standard_normal(n) * 0.3 + np.sin(2 * np.pi * rng.uniform(80, 1200) * t)
+    body *= np.exp(-t * rng.uniform(0.5, 8.0))
+    lead, tail = (int(rng.uniform(0, 0.3) * sr) for _ in range(2))
+    x = np.concatenate([np.zeros(lead), body, np.zeros(tail)]) * 10 ** (rng.uniform(-40, -6) / 20)
+    x = (x + rng.standard_normal(len(x)) * 1e-4).astype(np.float32)
+    return x, sr
+
+
+async def _load(root: Path, n_clips: int, burst: int, workers: Optional[int], chunk: int, dup_rate: float, drop_rate: float) -> None:
+    rng = np.random.default_rng(3)
+    svc = IngestService(root, workers=workers)
+    await svc.start()
+
+    uploaded_s = 0.0
+    resumed = 0
+    reencoded = 0
+    previous: List[Tuple[np.ndarray, int, int]] = []  # (audio, sr, channels) sent before
+
+    submit_wait: List[float] = []
+
+    async def upload(i: int, accepted: asyncio.Future) -> IngestResult:
+        try:
+            return await _upload(i, accepted)
+        finally:
+            # failed before submit(): still counts as done for the burst
+            if not accepted.done():
+                accepted.set_result(None)
+
+    async def _upload(i: int, accepted: asyncio.Future) -> IngestResult:
+        nonlocal uploaded_s, resumed, reencoded
+        if previous and rng.random() < dup_rate:
+            x, sr, channels = previous[int(rng.integers(len(previous)))]
+            if rng.random() < 0.5:
+                # same recording, sent again as mono / dual-mono stereo: new bytes, same clip
+                channels = 3 - channels
+                reencoded += 1
+        else:
+            x, sr = _phone_clip(rng)
+            channels = int(rng.choice([1, 2]))
+            uploaded_s += len(x) / sr
+            previous.append((x, sr, channels))
+        data = _wav_bytes(x, sr, channels)
+        uid = f"u{i:06d}"
+        offset = svc.spool.begin(uid, size=len(data))
+        drop_at = int(len(data) * rng.uniform(0.2, 0.8)) if rng.random() < drop_rate else None
+        while offset < len(data):
+            piece = data[offset : offset + chunk]
+            if drop_at is not None and offset + len(piece) > drop_at:
+                # connection drops mid-chunk; the client comes back and resumes
+                svc.spool.write(uid, offset, piece[: drop_at - offset])
+                drop_at = None
+                resumed += 1
+                offset = svc.spool.begin(uid, size=len(data))
+                continue
+            offset = svc.spool.write(uid, offset, piece)
+            await asyncio.sleep(0)
+        ts = time.perf_counter()
+        fut = await svc.submit(uid)
+        submit_wait.append(time.perf_counter() - ts)
+        accepted.set_result(None)
+        return await fut
+
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    tasks: List[asyncio.Task] = []
+    for start in range(0, n_clips, burst):
+        # a burst: everyone hits upload at once; the next burst starts once
+        # this one's uploads have been accepted (not necessarily processed)
+        accepted = [loop.create_future() for _ in range(start, min(n_clips, start + burst))]
+        tasks += [asyncio.create_task(upload(start + k, a)) for k, a in enumerate(accepted)]
+        await asyncio.gather(*accepted)
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    wall = time.perf_counter() - t0
+    await svc.stop()
+
+    results: List[IngestResult] = [r for r in outcomes if isinstance(r, IngestResult)]
+    failed = [r for r in outcomes if not isinstance(r, IngestResult)]
+    fresh = [r for r in results if not r.duplicate and r.error is None]
+    dups = sum(r.duplicate for r in results)
+    errors = sum(r.error is not None and not r.duplicate for r in results) + len(failed)
+    print(f"{n_clips:,} uploads in bursts of {burst}: {wall:.2f}s wall, {n_clips / wall:,.0f} clips/s, "
+          f"{uploaded_s / wall:,.0f}x realtime, workers={svc.workers}")
+    print(f"processed {len(fresh):,}, duplicates skipped {dups:,} ({reencoded:,} sent in another channel layout), "
+          f"resumed uploads {resumed:,}, errors {errors}")
+    if failed:
+        print(f"  first failure: {failed[0]!r}")
+    if {r.hash for r in results if r.duplicate and r.hash} - {r.hash for r in fresh}:
+        print("  warning: a duplicate points at a clip that was never processed")
+    if fresh:
+        outs = np.array([r.lufs_out for r in fresh])
+        limited = sum(r.limited for r in fresh)
+        print(f"loudness out: median {np.median(outs):.1f} LUFS (target {TARGET_LUFS:.0f}), "
+              f"{limited} peak-limited under target; trimmed {sum(r.trimmed_s for r in fresh):.0f}s of silence")
+
+    by_stage: Dict[str, List[float]] = defaultdict(list)
+    for r in results:
+        for stage, secs in r.timings.items():
+            by_stage[stage].append(secs)
+    by_stage["submit (back-pressure)"] = submit_wait
+    print(f"\n{'stage':<24} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage in ["submit (back-pressure)", "queue:hash", "hash", "queue:process", "decode", "resample", "trim", "normalize", "write", "total"]:
+        v = by_stage.get(stage, [])
+        if v:
+            print(f"{stage:<24} {len(v):>6} {pct(v, 50) * 1e3:>8.1f} {pct(v, 95) * 1e3:>8.1f} {pct(v, 99) * 1e3:>8.1f}")
+
+
+def bench(n_clips: int, burst: int, workers: Optional[int], chunk: int, dup_rate: float, drop_rate: float) -> None:
+    root = Path(tempfile.mkdtemp(prefix="crowdnoise-ingest-"))
+    try:
+        asyncio.run(_load(root, n_clips, burst, workers, chunk, dup_rate, drop_rate))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="crowd·noise clip ingest")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="replay bursts of uploads, report per-stage latency")
+    b.add_argument("--clips", type=int, default=2000)
+    b.add_argument("--burst", type=int, default=250)
+    b.add_argument("--workers", type=int, default=None)
+    b.add_argument("--chunk", type=int, default=64 * 1024, help="upload chunk size (bytes)")
+    b.add_argument("--dups", type=float, default=0.1, help="share of uploads that repeat an earlier clip")
+    b.add_argument("--drops", type=float, default=0.05, help="share of uploads interrupted and resumed")
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        bench(args.clips, args.burst, args.workers, args.chunk, args.dups, args.drops)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,39 @@
+"""
+Append-only json-lines logs (the reminder journal, the ingest library index).
+Stdlib only.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import List
+
+
+def read_jsonl(path: Path) -> List[dict]:
+    """
+    Records up to the first unreadable line. Anything after it (a torn write
+    from a crash) is truncated off the file, and a missing final newline is
+    restored, so appending afterwards can't glue onto a partial line.
+    """
+    if not path.exists():
+        return []
+    records = []
+    good = 0  # byte offset just past the last good line
+    newline = True
+    with path.open("rb") as fh:
+        for line in fh:
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+            good += len(line)
+            newline = line.endswith(b"\n")
+    if path.stat().st_size != good:
+        with path.open("r+b") as fh:
+            fh.truncate(good)
+    if good and not newline:
+        with path.open("ab") as fh:
+            fh.write(b"\n")
+    return records
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Multitrack mixer for layered remakes ("replace drums with our drums").
+
+The arrangement is a timeline of clip placements (start, gain, pan, effect
+chain) on tracks (volume, pan, mute/solo). Rendering is a generator of
+fixed-size stereo blocks, so a song is never held in memory at once.
+
+A clip's processed audio is computed the first time a placement reaches it
+and kept in an LRU cache keyed by (clip hash, effect chain). Swapping one
+track's clips only processes the new clips; every other track's audio comes
+straight from the cache.
+
+Needs numpy.
+
+run:
+
+    python3 -m engine.mixer bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, content_hash, float_to_pcm16, open_wav_writer, read_wav, synth_clip, wav_info
+
+
+BLOCK = 4096  # samples per rendered block
+
+
+# ---------------------------
+# Effects (the sound changer)
+# ---------------------------
+
+
+@dataclass(frozen=True)
+class Effect:
+    name: str
+    params: Tuple[float, ...] = ()
+
+
+Chain = Tuple[Effect, ...]
+
+
+def _fx_gain(x: np.ndarray, sr: int, db: float) -> np.ndarray:
+    return x * np.float32(10.0 ** (db / 20.0))
+
+
+def _fx_reverse(x: np.ndarray, sr: int) -> np.ndarray:
+    return x[::-1].copy()
+
+
+def _fx_pitch(x: np.ndarray, sr: int, semitones: float) -> np.ndarray:
+    # tape-style: pitch and length change together
+    ratio = 2.0 ** (semitones / 12.0)
+    n = max(1, int(len(x) / ratio))
+    return np.interp(np.arange(n) * ratio, np.arange(len(x)), x).astype(np.float32)
+
+
+def _spectral(x: np.ndarray, sr: int, gain_at: Callable[[np.ndarray], np.ndarray], margin: int = 1024) -> np.ndarray:
+    # zero-phase filtering rings both ways; pad so that lands in silence
+    # instead of wrapping around onto the clip's other end
+    n = 1 << max(1, int(np.ceil(np.log2(len(x) + margin))))
+    spec = np.fft.rfft(x, n)
+    spec *= gain_at(np.fft.rfftfreq(n, 1.0 / sr))
+    return np.fft.irfft(spec, n)[: len(x)].astype(np.float32)
+
+
+def _fx_lowpass(x: np.ndarray, sr: int, cutoff: float) -> np.ndarray:
+    # 2nd-order butterworth magnitude, zero phase
+    return _spectral(x, sr, lambda f: 1.0 / np.sqrt(1.0 + (f / cutoff) ** 4), _ring(sr, cutoff))
+
+
+def _fx_highpass(x: np.ndarray, sr: int, cutoff: float) -> np.ndarray:
+    return _spectral(x, sr, lambda f: 1.0 / np.sqrt(1.0 + (cutoff / np.maximum(f, 1e-3)) ** 4), _ring(sr, cutoff))
+
+
+def _ring(sr: int, cutoff: float) -> int:
+    # a butterworth's impulse response has died down ~4 periods of the cutoff in
+    return max(1024, int(4.0 * sr / max(cutoff, 1.0)))
+
+
+def _fx_decay(x: np.ndarray, sr: int, seconds: float) -> np.ndarray:
+    return x * np.exp(-np.arange(len(x), dtype=np.float32) / (seconds * sr)).astype(np.float32)
+
+
+def _fx_drive(x: np.ndarray, sr: int, amount: float) -> np.ndarray:
+    k = 1.0 + 20.0 * amount
+    return (np.tanh(k * x) / np.tanh(k)).astype(np.float32)
+
+
+def _fx_delay(x: np.ndarray, sr: int, seconds: float, feedback: float, repeats: float = 3) -> np.ndarray:
+    d = int(seconds * sr)
+    repeats = int(repeats)
+    out = np.zeros(len(x) + d * repeats, dtype=np.float32)
+    out[: len(x)] += x
+    for r in range(1, repeats + 1):
+        out[r * d : r * d + len(x)] += x * np.float32(feedback**r)
+    return out
+
+
+def _fx_reverb(x: np.ndarray, sr: int, seconds: float, mix: float) -> np.ndarray:
+    # convolution with exponentially decaying noise; seeded so the cache key
+    # fully determines the output
+    n_ir = max(1, int(seconds * sr))
+    rng = np.random.default_rng(n_ir)
+    ir = rng.standard_normal(n_ir) * np.exp(-6.9 * np.arange(n_ir) / n_ir)
+    ir /= np.sqrt(np.sum(ir * ir)) + 1e-9
+    n = len(x) + n_ir - 1
+    nfft = 1 << int(np.ceil(np.log2(n)))
+    wet = np.fft.irfft(np.fft.rfft(x, nfft) * np.fft.rfft(ir, nfft), nfft)[:n]
+    out = wet * mix
+    out[: len(x)] += x * (1.0 - mix)
+    return out.astype(np.float32)
+
+
+EFFECTS: Dict[str, Callable[..., np.ndarray]] = {
+    "gain": _fx_gain,
+    "reverse": _fx_reverse,
+    "pitch": _fx_pitch,
+    "lowpass": _fx_lowpass,
+    "highpass": _fx_highpass,
+    "decay": _fx_decay,
+    "drive": _fx_drive,
+    "delay": _fx_delay,
+    "reverb": _fx_reverb,
+}
+
+
+# how the effects that change a clip's length change it, so a seek can tell
+# whether a clip is still ringing without processing it; effects not listed
+# here keep the length (or, if registered without a rule, get processed)
+LENGTHS: Dict[str, Callable[..., int]] = {
+    "pitch": lambda n, sr, semitones: max(1, int(n / 2.0 ** (semitones / 12.0))),
+    "delay": lambda n, sr, seconds, feedback, repeats=3: n + int(seconds * sr) * int(repeats),
+    "reverb": lambda n, sr, seconds, mix: n + max(1, int(seconds * sr)) - 1,
+}
+_SAME_LENGTH = {"gain", "reverse", "lowpass", "highpass", "decay", "drive"}
+
+
+def chain_length(n: int, chain: Chain, sr: int = SAMPLE_RATE) -> Optional[int]:
+    """Length of an n-sample clip after `chain`, or None if some effect has no length rule."""
+    for fx in chain:
+        rule = LENGTHS.get(fx.name)
+        if rule is not None:
+            n = rule(n, sr, *fx.params)
+        elif fx.name not in _SAME_LENGTH:
+            return None
+    return n
+
+
+def apply_chain(x: np.ndarray, chain: Chain, sr: int = SAMPLE_RATE) -> np.ndarray:
+    for fx in chain:
+        try:
+            fn = EFFECTS[fx.name]
+        except KeyError:
+            raise ValueError(f"unknown effect: {fx.name!r}") from None
+        x = fn(x, sr, *fx.params)
+    return np.asarray(x, dtype=np.float32)
+
+
+# ---------------------------
+# Clips + processed-audio cache
+# ---------------------------
+
+
+class ClipStore:
+    """Raw clips by content hash; files are only read when first needed."""
+
+    def __init__(self):
+        self._audio: Dict[str, np.ndarray] = {}
+        self._paths: Dict[str, Path] = {}
+
+    def add(self, samples: np.ndarray) -> str:
+        x = np.asarray(samples, dtype=np.float32)
+        key = content_hash(x)
+        self._audio[key] = x
+        return key
+
+    def add_file(self, path: Path, key: Optional[str] = None) -> str:
+        """
+        Register a wav; pass `key` (ingest's IngestResult.hash, the same
+        content_hash `add` would compute) to avoid reading it now.
+        """
+        if key is None:
+            return self.add(read_wav(path)[0])
+        self._paths[key] = Path(path)
+        return key
+
+    def get(self, key: str) -> np.ndarray:
+        x = self._audio.get(key)
+        if x is None:
+            x = read_wav(self._paths[key])[0]
+            self._audio[key] = x
+        return x
+
+    def length(self, key: str) -> int:
+        """Samples in the clip; reads only the wav header if it isn't loaded."""
+        x = self._audio.get(key)
+        return len(x) if x is not None else wav_info(self._paths[key])[0]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    process_s: float = 0.0
+
+
+class ProcessedCache:
+    """LRU of processed clip audio keyed by (clip hash, chain), bounded by bytes."""
+
+    def __init__(self, clips: ClipStore, max_bytes: int = 256 << 20, sr: int = SAMPLE_RATE):
+        self.clips = clips
+        self.max_bytes = max_bytes
+        self.sr = sr
+        self.bytes = 0
+        self.stats = CacheStats()
+        self._lru: "OrderedDict[Tuple[str, Chain], np.ndarray]" = OrderedDict()
+        self._lengths: Dict[Tuple[str, Chain], int] = {}  # outlives eviction; just ints
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def get(self, clip: str, chain: Chain) -> np.ndarray:
+        key = (clip, chain)
+        x = self._lru.get(key)
+        if x is not None:
+            self._lru.move_to_end(key)
+            self.stats.hits += 1
+            return x
+
+        self.stats.misses += 1
+        t0 = time.perf_counter()
+        x = apply_chain(self.clips.get(clip), chain, self.sr)
+        x.setflags(write=False)
+        self.stats.process_s += time.perf_counter() - t0
+
+        self._lru[key] = x
+        self._lengths[key] = len(x)
+        self.bytes += x.nbytes
+        while self.bytes > self.max_bytes and len(self._lru) > 1:
+            _, old = self._lru.popitem(last=False)
+            self.bytes -= old.nbytes
+            self.stats.evictions += 1
+        return x
+
+    def length(self, clip: str, chain: Chain) -> int:
+        """Processed length without processing, when the chain's effects allow it."""
+        key = (clip, chain)
+        n = self._lengths.get(key)
+        if n is None:
+            n = chain_length(self.clips.length(clip), chain, self.sr)
+            if n is None:
+                n = len(self.get(clip, chain))
+            self._lengths[key] = n
+        return n
+
+
+# ---------------------------
+# Timeline
+# ---------------------------
+
+
+@dataclass
+class Track:
+    name: str
+    gain: float = 1.0
+    pan: float = 0.0  # -1 left .. 1 right
+    mute: bool = False
+    solo: bool = False
+
+
+@dataclass
+class Placement:
+    track: str
+    clip: str  # clip hash
+    start: float  # seconds
+    gain: float = 1.0
+    pan: float = 0.0
+    chain: Chain = ()
+
+
+@dataclass
+class Timeline:
+    tracks: Dict[str, Track] = field(default_factory=dict)
+    placements: List[Placement] = field(default_factory=list)
+    sr: int = SAMPLE_RATE
+
+    def track(self, name: str, **kw) -> Track:
+        t = self.tracks.get(name)
+        if t is None:
+            t = self.tracks[name] = Track(name, **kw)
+        return t
+
+    def place(self, track: str, clip: str, start: float, **kw) -> Placement:
+        self.track(track)
+        p = Placement(track, clip, start, **kw)
+        self.placements.append(p)
+        return p
+
+    def swap(self, track: str, mapping: Union[Dict[str, str], Callable[[Placement], Placement]]) -> int:
+        """
+        Replace clips on one track, either with a {old clip: new clip} map or a
+        function from placement to placement. Returns how many changed.
+        """
+        changed = 0
+        for i, p in enumerate(self.placements):
+            if p.track != track:
+                continue
+            new = mapping(p) if callable(mapping) else replace(p, clip=mapping.get(p.clip, p.clip))
+            if new != p:
+                self.placements[i] = new
+                changed += 1
+        return changed
+
+
+def _pan_gains(pan: float) -> Tuple[float, float]:
+    # constant power
+    theta = (min(1.0, max(-1.0, pan)) + 1.0) * np.pi / 4.0
+    return float(np.cos(theta)), float(np.sin(theta))
+
+
+def render(
+    timeline: Timeline,
+    cache: ProcessedCache,
+    block: int = BLOCK,
+    start: float = 0.0,
+    end: Optional[float] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Yields (block, 2) float32 stereo blocks from `start` to `end` seconds (or
+    until the last clip rings out). Each block only touches the placements
+    that overlap it.
+    """
+    sr = timeline.sr
+    soloed = any(t.solo for t in timeline.tracks.values())
+    live = []
+    for p in timeline.placements:
+        t = timeline.tracks.get(p.track) or Track(p.track)
+        if t.mute or (soloed and not t.solo):
+            continue
+        gl, gr = _pan_gains(p.pan + t.pan)
+        g = p.gain * t.gain
+        live.append((int(round(p.start * sr)), p, g * gl, g * gr))
+    live.sort(key=lambda item: item[0])
+    starts = [item[0] for item in live]
+
+    pos = int(round(start * sr))
+    stop = None if end is None else int(round(end * sr))
+    nxt = bisect.bisect_left(starts, pos)
+    # anything that started before `start` may still be ringing; only those
+    # get processed (lengths come from the cache without touching audio)
+    active: List[Tuple[int, np.ndarray, float, float]] = [
+        (s0, cache.get(p.clip, p.chain), gl, gr)
+        for s0, p, gl, gr in live[:nxt]
+        if s0 + cache.length(p.clip, p.chain) > pos
+    ]
+
+    while True:
+        if stop is not None and pos >= stop:
+            return
+        if stop is None and not active and nxt >= len(live):
+            return
+        n = block if stop is None else min(block, stop - pos)
+        blk_end = pos + n
+        while nxt < len(live) and live[nxt][0] < blk_end:
+            s0, p, gl, gr = live[nxt]
+            active.append((s0, cache.get(p.clip, p.chain), gl, gr))
+            nxt += 1
+
+        out = np.zeros((n, 2), dtype=np.float32)
+        still = []
+        for s0, x, gl, gr in active:
+            a = max(pos, s0)
+            b = min(blk_end, s0 + len(x))
+            if b > a:
+                seg = x[a - s0 : b - s0]
+                out[a - pos : b - pos, 0] += seg * gl
+                out[a - pos : b - pos, 1] += seg * gr
+            if s0 + len(x) > blk_end:
+                still.append((s0, x, gl, gr))
+        active = still
+        yield out
+        pos = blk_end
+
+
+def bounce(timeline: Timeline, cache: ProcessedCache, path: Path, block: int = BLOCK) -> float:
+    """Render straight into a 16-bit stereo wav, block by block. Returns seconds written."""
+    n = 0
+    with open_wav_writer(path, 2, timeline.sr) as wf:
+        for out in render(timeline, cache, block):
+            wf.writeframes(float_to_pcm16(out))
+            n += len(out)
+    return n / timeline.sr
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+
+
+def demo_timeline(clips: ClipStore, seconds: float, bpm: float = 96.0, seed: int = 1) -> Timeline:
+    """A remake-shaped arrangement: drums, hats, keys, bass, vocal chops."""
+    rng = np.random.default_rng(seed)
+    tl = Timeline()
+    kit = {k: [clips.add(synth_clip(k, rng)) for _ in range(4)] for k in ("kick", "snare", "hi-hat", "clap", "keys", "vocal")}
+    tl.track("drums", gain=0.9)
+    tl.track("hats", gain=0.5, pan=0.3)
+    tl.track("claps", gain=0.5, pan=-0.3)
+    tl.track("keys", gain=0.6, pan=-0.2)
+    tl.track("bass", gain=0.8)
+    tl.track("vocal", gain=0.6, pan=0.15)
+
+    beat = 60.0 / bpm
+    roots = [0.0, 5.0, 7.0, 3.0]
+    for b in range(int(seconds / beat)):
+        t = b * beat
+        bar = b // 4
+        tl.place("drums", kit["kick" if b % 2 == 0 else "snare"][bar % 4], t, chain=(Effect("drive", (0.2,)),))
+        for half in (0.0, 0.5):
+            hat_chain = (Effect("highpass", (6000.0,)),) if bar % 4 else (Effect("highpass", (6000.0,)), Effect("reverse"))
+            tl.place("hats", kit["hi-hat"][(b * 2 + int(half * 2)) % 4], t + half * beat, gain=0.8, chain=hat_chain)
+        if b % 4 == 3:
+            tl.place("claps", kit["clap"][bar % 4], t, chain=(Effect("reverb", (0.8, 0.3)),))
+        if b % 4 == 0:
+            root = roots[bar % 4]
+            tl.place("keys", kit["keys"][0], t, chain=(Effect("pitch", (root,)), Effect("reverb", (1.2, 0.25))))
+            tl.place("bass", kit["keys"][1], t, chain=(Effect("pitch", (root - 24.0,)), Effect("lowpass", (300.0,)), Effect("decay", (1.5,))))
+        if b % 8 == 6:
+            tl.place("vocal", kit["vocal"][bar % 4], t, pan=float(rng.uniform(-0.5, 0.5)),
+                     chain=(Effect("delay", (beat / 2, 0.4)), Effect("gain", (-3.0,))))
+    return tl
+
+
+def bench(seconds: float, block: int) -> None:
+    clips = ClipStore()
+    tl = demo_timeline(clips, seconds)
+    cache = ProcessedCache(clips)
+    unique = len({(p.clip, p.chain) for p in tl.placements})
+    print(f"{seconds:.0f}s remake: {len(tl.tracks)} tracks, {len(tl.placements):,} placements, "
+          f"{unique} unique (clip, chain) renders, block={block}")
+
+    def timed_render(label: str) -> None:
+        before = CacheStats(**vars(cache.stats))
+        t0 = time.perf_counter()
+        total = 0
+        peak = 0
+        for out in render(tl, cache, block):
+            total += len(out)
+            peak = max(peak, out.nbytes)
+        dt = time.perf_counter() - t0
+        s = cache.stats
+        print(f"{label:<22} {dt * 1e3:>7.0f}ms  {total / tl.sr / dt:>6.0f}x realtime  "
+              f"misses={s.misses - before.misses:<4} hits={s.hits - before.hits:<5} "
+              f"fx={1e3 * (s.process_s - before.process_s):.0f}ms  block={peak // 1024}KB")
+
+    timed_render("cold (fx computed)")
+    timed_render("warm (all cached)")
+
+    # "replace drums with our drums": new kick/snare recordings, same pattern
+    rng = np.random.default_rng(99)
+    ours = {old: clips.add(synth_clip("kick" if i % 2 == 0 else "snare", rng))
+            for i, old in enumerate(sorted({p.clip for p in tl.placements if p.track == "drums"}))}
+    changed = tl.swap("drums", ours)
+    print(f"swapped {changed} drum placements ({len(ours)} clips)")
+    timed_render("after drum swap")
+
+    # scrub to 5s before the end with a cold cache: only what's still ringing there gets processed
+    fresh = ProcessedCache(clips)
+    t0 = time.perf_counter()
+    for _ in render(tl, fresh, block, start=max(0.0, seconds - 5.0)):
+        pass
+    distinct = len({(p.clip, p.chain) for p in tl.placements})
+    print(f"seek to t-5s (cold):   {(time.perf_counter() - t0) * 1e3:>7.0f}ms  processed {fresh.stats.misses} of {distinct} clip/chain pairs")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "remake.wav"
+        t0 = time.perf_counter()
+        secs = bounce(tl, cache, out, block)
+        dt = time.perf_counter() - t0
+        print(f"bounce to wav: {secs:.1f}s of audio in {dt * 1e3:.0f}ms ({secs / dt:.0f}x realtime, "
+              f"{out.stat().st_size / 1e6:.1f} MB)")
+    print(f"cache: {len(cache)} entries, {cache.bytes / 1e6:.1f} MB, {cache.stats.evictions} evictions")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="crowd·noise multitrack mixer")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="render throughput in realtime multiples")
+    b.add_argument("--seconds", type=float, default=180.0)
+    b.add_argument("--block", type=int, default=BLOCK)
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        bench(args.seconds, args.block)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
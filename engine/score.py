@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Remake similarity scoring: "better remakes = more of the cover revealed".
+
+A remake is compared with the reference track on three things:
+  - rhythm: onset envelopes (log-mel flux), correlated per segment with a few
+    frames of timing slack
+  - harmony: chroma (12 pitch classes), per segment
+  - tempo: autocorrelation of the whole onset envelope
+
+Audio is streamed from disk in blocks and only the per-frame features are
+kept. Reference features are computed once and cached on disk by file hash.
+A resubmission that only changed a few time ranges recomputes just the frames
+and segments under those ranges.
+
+Needs numpy.
+
+run:
+
+    python3 -m engine.score bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, file_hash, hann_window, iter_wav, mel_filterbank, synth_clip, wav_info, write_wav
+
+
+SCORE_VERSION = 2  # bump when cached reference features change shape/meaning
+N_FFT = 2048
+HOP = 512
+N_MELS = 40
+SEGMENT_S = 4.0
+MAX_LAG = 3  # frames of timing slack (~35 ms) when matching onsets
+READ_BLOCK = 1 << 16
+
+W_RHYTHM = 0.5
+W_HARMONY = 0.5
+W_TEMPO = 0.15  # share of the total that comes from tempo; the rest is per-segment
+
+
+def _segment_frames(sr: int) -> int:
+    return int(round(SEGMENT_S * sr / HOP))
+
+
+# ---------------------------
+# Streaming features
+# ---------------------------
+
+
+@lru_cache(maxsize=4)
+def _chroma_map(sr: int, n_fft: int = N_FFT) -> np.ndarray:
+    """(bins, 12) 0/1 map of fft bins (110 Hz - 5 kHz) to pitch classes; below that it's mostly kick."""
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    m = np.zeros((len(freqs), 12), dtype=np.float32)
+    ok = (freqs >= 110.0) & (freqs <= 5000.0)
+    pc = (np.round(12.0 * np.log2(freqs[ok] / 440.0)) + 69).astype(int) % 12
+    m[np.nonzero(ok)[0], pc] = 1.0
+    return m
+
+
+def _frame_block(frames: np.ndarray, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(log-mel, chroma) for a (T, N_FFT) block of frames."""
+    spec = np.fft.rfft(frames * hann_window(N_FFT), axis=1)
+    spec = (spec.real * spec.real + spec.imag * spec.imag).astype(np.float32)
+    logmel = np.log(spec @ mel_filterbank(sr, N_FFT, N_MELS).T + 1e-10)
+    chroma = spec @ _chroma_map(sr)
+    return logmel, chroma
+
+
+def _stream_frames(blocks: Iterable[np.ndarray]) -> Iterable[np.ndarray]:
+    """
+    Frames starting at every HOP of the stream (the last ones zero-padded),
+    emitted as soon as enough samples have arrived.
+    """
+    buf = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        buf = np.concatenate([buf, block])
+        if len(buf) >= N_FFT:
+            n = (len(buf) - N_FFT) // HOP + 1
+            yield np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP][:n]
+            buf = buf[n * HOP :]
+    if len(buf):
+        n = -(-len(buf) // HOP)
+        buf = np.pad(buf, (0, (n - 1) * HOP + N_FFT - len(buf)))
+        yield np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP][:n]
+
+
+@dataclass
+class TrackFeatures:
+    logmel: np.ndarray  # (T, N_MELS)
+    chroma: np.ndarray  # (T, 12)
+    n_samples: int
+    sr: int
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.logmel)
+
+    def onset(self) -> np.ndarray:
+        flux = np.zeros(len(self.logmel), dtype=np.float32)
+        if len(self.logmel) > 1:
+            flux[1:] = np.maximum(self.logmel[1:] - self.logmel[:-1], 0.0).mean(axis=1)
+        return flux
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as fh:
+            np.savez(fh, logmel=self.logmel, chroma=self.chroma, meta=np.array([self.n_samples, self.sr]))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: Path) -> "TrackFeatures":
+        with np.load(path) as z:
+            n_samples, sr = (int(v) for v in z["meta"])
+            return TrackFeatures(z["logmel"], z["chroma"], n_samples, sr)
+
+
+def analyze(path: Path) -> TrackFeatures:
+    n_samples, sr = wav_info(path)
+    logmel, chroma = [], []
+    for frames in _stream_frames(iter_wav(path, READ_BLOCK)):
+        lm, ch = _frame_block(frames, sr)
+        logmel.append(lm)
+        chroma.append(ch)
+    if not logmel:
+        return TrackFeatures(np.zeros((0, N_MELS), np.float32), np.zeros((0, 12), np.float32), n_samples, sr)
+    return TrackFeatures(np.concatenate(logmel), np.concatenate(chroma), n_samples, sr)
+
+
+def _analyze_frames(path: Path, f0: int, f1: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Features for frames [f0, f1) only, reading just the samples under them."""
+    _, sr = wav_info(path)
+    start, stop = f0 * HOP, (f1 - 1) * HOP + N_FFT
+    x = np.concatenate(list(iter_wav(path, READ_BLOCK, start, stop)) or [np.zeros(0, np.float32)])
+    x = np.pad(x, (0, stop - start - len(x)))
+    frames = np.lib.stride_tricks.sliding_window_view(x, N_FFT)[::HOP][: f1 - f0]
+    return _frame_block(frames, sr)
+
+
+def reference_cache_path(path: Path, cache_dir: Path) -> Path:
+    """Where `reference_features` keeps the features for this file's content."""
+    return cache_dir / f"{file_hash(path)}.ref.v{SCORE_VERSION}.npz"
+
+
+def reference_features(path: Path, cache_dir: Path, cached: Optional[Path] = None) -> TrackFeatures:
+    """
+    Reference features, computed once per file content and kept on disk.
+    Pass `cached` (from `reference_cache_path`) if you already have it, to
+    skip hashing the file again.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cached = cached or reference_cache_path(path, cache_dir)
+    if cached.exists():
+        try:
+            return TrackFeatures.load(cached)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass
+    feats = analyze(path)
+    feats.save(cached)
+    return feats
+
+
+def estimate_tempo(onset: np.ndarray, sr: int, lo_bpm: float = 60.0, hi_bpm: float = 200.0) -> float:
+    """BPM from the onset envelope's autocorrelation (0.0 if there's nothing to go on)."""
+    x = onset - onset.mean() if len(onset) else onset
+    if len(x) < 4 or not np.any(x):
+        return 0.0
+    spec = np.fft.rfft(x, 2 * len(x))
+    ac = np.fft.irfft(spec * np.conj(spec))[: len(x)]
+    fps = sr / HOP
+    lo = max(1, int(60.0 * fps / hi_bpm))
+    hi = min(len(ac) - 2, int(math.ceil(60.0 * fps / lo_bpm)))
+    if hi <= lo:
+        return 0.0
+    lags = np.arange(lo, hi + 1)
+    # mild preference for moderate tempi so octave errors go the usual way
+    prior = np.exp(-0.5 * (np.log2(60.0 * fps / lags / 110.0) / 1.2) ** 2)
+    best = int(lags[np.argmax(ac[lo : hi + 1] * prior)])
+    # parabolic refinement of the peak
+    a, b, c = ac[best - 1], ac[best], ac[best + 1]
+    denom = a - 2 * b + c
+    shift = 0.5 * (a - c) / denom if denom else 0.0
+    return 60.0 * fps / (best + shift)
+
+
+def tempo_similarity(bpm_a: float, bpm_b: float) -> float:
+    """1.0 for the same tempo (half/double time counts), 0.0 past ~7% off."""
+    if bpm_a <= 0 or bpm_b <= 0:
+        return 0.0
+    off = min(abs(math.log2(bpm_a / (bpm_b * k))) for k in (0.5, 1.0, 2.0))
+    return max(0.0, 1.0 - off / 0.1)
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+
+
+@dataclass
+class Score:
+    total: float  # 0..1
+    progress: int  # 0..100, how much of the cover to reveal
+    rhythm: float
+    harmony: float
+    tempo: float
+    tempo_bpm: float
+    segments: np.ndarray = field(repr=False)  # per-segment score, 0..1
+    recomputed_segments: int = 0
+
+
+@dataclass
+class _RemakeState:
+    features: TrackFeatures
+    rhythm: np.ndarray
+    harmony: np.ndarray
+
+
+class RemakeScorer:
+    """
+    Scores remakes against one reference. Keeps each remake's features between
+    submissions so `score(remake_id, path, changed=[(t0, t1), ...])` only
+    redoes the frames and segments inside the changed ranges (seconds).
+    """
+
+    def __init__(self, reference: TrackFeatures):
+        self.ref = reference
+        self.sr = reference.sr
+        self.seg = _segment_frames(self.sr)
+        self.n_segments = max(1, -(-reference.n_frames // self.seg))
+        self._ref_onset = self._padded(reference.onset())
+        self._ref_chroma = self._seg_chroma(reference.chroma, np.arange(self.n_segments))
+        self.ref_tempo = estimate_tempo(reference.onset(), self.sr)
+        self._remakes: Dict[str, _RemakeState] = {}
+
+    def score(self, remake_id: str, path: Path, changed: Optional[Sequence[Tuple[float, float]]] = None) -> Score:
+        n_samples, sr = wav_info(path)
+        if sr != self.sr:
+            raise ValueError(f"{path}: sample rate {sr} != reference {self.sr}; ingest should have resampled it")
+
+        state = self._remakes.get(remake_id)
+        if changed is not None and state is not None and state.features.n_samples == n_samples:
+            segs = self._update_ranges(state, path, changed)
+        else:
+            feats = analyze(path)
+            state = _RemakeState(feats, np.zeros(self.n_segments), np.zeros(self.n_segments))
+            segs = np.arange(self.n_segments)
+            self._remakes[remake_id] = state
+
+        if len(segs):
+            onset = self._padded(state.features.onset())
+            state.rhythm[segs] = self._seg_rhythm(onset, segs)
+            state.harmony[segs] = self._seg_harmony(state.features.chroma, segs)
+        return self._combine(state, len(segs))
+
+    def forget(self, remake_id: str) -> None:
+        self._remakes.pop(remake_id, None)
+
+    # --- incremental ---
+
+    def _update_ranges(self, state: _RemakeState, path: Path, changed: Sequence[Tuple[float, float]]) -> np.ndarray:
+        feats = state.features
+        touched = set()
+        for t0, t1 in changed:
+            s0 = max(0, int(t0 * self.sr))
+            s1 = min(feats.n_samples, int(math.ceil(t1 * self.sr)))
+            if s1 <= s0:
+                continue
+            # every frame whose window overlaps [s0, s1), plus the one before it
+            # (onset at frame f is a diff against f - 1)
+            f0 = max(0, (s0 - N_FFT) // HOP + 1)
+            f1 = min(feats.n_frames, (s1 - 1) // HOP + 1)
+            if f1 <= f0:
+                continue
+            lm, ch = _analyze_frames(path, f0, f1)
+            feats.logmel[f0:f1] = lm
+            feats.chroma[f0:f1] = ch
+            # onset changes on [f0, f1]; lag slack reaches MAX_LAG frames further
+            lo = max(0, f0 - MAX_LAG) // self.seg
+            hi = min(self.n_segments - 1, (f1 + MAX_LAG) // self.seg)
+            touched.update(range(lo, hi + 1))
+        return np.array(sorted(touched), dtype=np.int64)
+
+    # --- vectorized per-segment similarity ---
+
+    def _padded(self, onset: np.ndarray) -> np.ndarray:
+        """Onset envelope cut/padded to whole segments, with MAX_LAG zeros either side."""
+        total = self.n_segments * self.seg
+        out = np.zeros(total + 2 * MAX_LAG, dtype=np.float32)
+        n = min(total, len(onset))
+        out[MAX_LAG : MAX_LAG + n] = onset[:n]
+        return out
+
+    def _seg_rhythm(self, onset: np.ndarray, segs: np.ndarray) -> np.ndarray:
+        base = segs[:, None] * self.seg + np.arange(self.seg)[None, :] + MAX_LAG
+        ref = _znorm(self._ref_onset[base])
+        best = np.full(len(segs), -1.0)
+        for lag in range(-MAX_LAG, MAX_LAG + 1):
+            corr = (ref * _znorm(onset[base + lag])).mean(axis=1)
+            best = np.maximum(best, corr)
+        return np.clip(best, 0.0, 1.0)
+
+    def _seg_chroma(self, chroma: np.ndarray, segs: np.ndarray) -> np.ndarray:
+        total = self.n_segments * self.seg
+        padded = np.zeros((total, 12), dtype=np.float32)
+        n = min(total, len(chroma))
+        padded[:n] = chroma[:n]
+        frames = np.sqrt(padded.reshape(self.n_segments, self.seg, 12)[segs])
+        # unit-norm frames so loud drum hits don't outvote the sustained chords;
+        # frames 40 dB under the segment's loudest aren't boosted up to match
+        norms = np.linalg.norm(frames, axis=2, keepdims=True)
+        floor = np.maximum(1e-2 * norms.max(axis=1, keepdims=True), 1e-6)
+        per_seg = (frames / np.maximum(norms, floor)).sum(axis=1)
+        centered = per_seg - per_seg.mean(axis=1, keepdims=True)
+        return centered / (np.linalg.norm(centered, axis=1, keepdims=True) + 1e-9)
+
+    def _seg_harmony(self, chroma: np.ndarray, segs: np.ndarray) -> np.ndarray:
+        sims = (self._ref_chroma[segs] * self._seg_chroma(chroma, segs)).sum(axis=1)
+        return np.clip(sims, 0.0, 1.0)
+
+    def _combine(self, state: _RemakeState, recomputed: int) -> Score:
+        seg_scores = (W_RHYTHM * state.rhythm + W_HARMONY * state.harmony) / (W_RHYTHM + W_HARMONY)
+        bpm = estimate_tempo(state.features.onset(), self.sr)
+        tempo = tempo_similarity(self.ref_tempo, bpm)
+        total = (1.0 - W_TEMPO) * float(seg_scores.mean()) + W_TEMPO * tempo
+        return Score(
+            total=total,
+            progress=int(round(100 * total)),
+            rhythm=float(state.rhythm.mean()),
+            harmony=float(state.harmony.mean()),
+            tempo=tempo,
+            tempo_bpm=bpm,
+            segments=seg_scores,
+            recomputed_segments=recomputed,
+        )
+
+
+def _znorm(x: np.ndarray) -> np.ndarray:
+    x = x - x.mean(axis=1, keepdims=True)
+    sd = x.std(axis=1, keepdims=True)
+    return np.where(sd > 1e-9, x / np.maximum(sd, 1e-9), 0.0)
+
+
+# ---------------------------
+# Group submissions
+# ---------------------------
+
+
+_worker_scorer: Optional[RemakeScorer] = None  # one per pool process, set by _init_worker
+
+
+def _init_worker(ref_cache: str) -> None:
+    global _worker_scorer
+    _worker_scorer = RemakeScorer(TrackFeatures.load(Path(ref_cache)))
+
+
+def _score_with(scorer: RemakeScorer, path: str) -> Score:
+    # one-off submissions: don't keep their features around for resubmits
+    try:
+        return scorer.score(path, Path(path))
+    finally:
+        scorer.forget(path)
+
+
+def _score_one(path: str) -> Score:
+    return _score_with(_worker_scorer, path)
+
+
+def score_group(reference: Path, remakes: Sequence[Path], cache_dir: Path, workers: Optional[int] = None) -> List[Score]:
+    """Score a batch of submissions against one reference across `workers` processes."""
+    ref_cache = reference_cache_path(reference, cache_dir)
+    ref = reference_features(reference, cache_dir, ref_cache)
+    jobs = [str(p) for p in remakes]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        scorer = RemakeScorer(ref)
+        return [_score_with(scorer, j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(ref_cache),)) as pool:
+        return list(pool.map(_score_one, jobs))
+
+
+# ---------------------------
+# Benchmark (synthetic songs)
+# ---------------------------
+
+
+def synth_song(
+    seconds: float,
+    bpm: float,
+    roots: Sequence[int],
+    seed: int,
+    jitter_s: float = 0.0,
+    sr: int = SAMPLE_RATE,
+) -> np.ndarray:
+    """Drum loop + one chord per bar; different seeds = different one-shots (a remake)."""
+    rng = np.random.default_rng(seed)
+    out = np.zeros(int(seconds * sr) + sr, dtype=np.float32)
+    kit = {k: synth_clip(k, rng, sr) for k in ("kick", "snare", "hi-hat")}
+    beat = 60.0 / bpm
+
+    def put(clip: np.ndarray, t: float, gain: float) -> None:
+        i = int((t + rng.uniform(-jitter_s, jitter_s)) * sr) if jitter_s else int(t * sr)
+        i = max(0, i)
+        n = min(len(clip), len(out) - i)
+        if n > 0:
+            out[i : i + n] += gain * clip[:n]
+
+    n_beats = int(seconds / beat)
+    for b in range(n_beats):
+        t = b * beat
+        put(kit["kick" if b % 2 == 0 else "snare"], t, 0.8)
+        put(kit["hi-hat"], t, 0.3)
+        put(kit["hi-hat"], t + beat / 2, 0.2)
+        if b % 4 == 0:
+            root = roots[(b // 4) % len(roots)]
+            tt = np.arange(int(4 * beat * sr)) / sr
+            chord = sum(np.sin(2 * np.pi * 220.0 * 2 ** ((root + iv) / 12.0) * tt) for iv in (0, 4, 7))
+            put((chord * np.exp(-tt * 0.6) / 3.0).astype(np.float32), t, 0.35)
+    out = out[: int(seconds * sr)]
+    return out / (np.abs(out).max() + 1e-9) * 0.9
+
+
+def bench(seconds: float, group: int, workers: Optional[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache_dir = tmp / "cache"
+        roots = [0, 5, 7, 3]
+
+        ref_path = tmp / "reference.wav"
+        write_wav(ref_path, synth_song(seconds, 96.0, roots, seed=1))
+        remakes = {
+            "close remake": synth_song(seconds, 96.0, roots, seed=2, jitter_s=0.008),
+            "half done": np.concatenate([synth_song(seconds / 2, 96.0, roots, seed=3), np.zeros(int(seconds / 2 * SAMPLE_RATE), np.float32)]),
+            "wrong chords": synth_song(seconds, 96.0, [2, 9, 11, 6], seed=4),
+            "different song": synth_song(seconds, 124.0, [1, 8, 10, 4], seed=5),
+        }
+        paths = {}
+        for name, audio in remakes.items():
+            paths[name] = tmp / f"{name.replace(' ', '_')}.wav"
+            write_wav(paths[name], audio)
+
+        t0 = time.perf_counter()
+        ref = reference_features(ref_path, cache_dir)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        ref = reference_features(ref_path, cache_dir)
+        warm = time.perf_counter() - t0
+        print(f"reference ({seconds:.0f}s): analyze {cold * 1e3:.0f}ms, from cache {warm * 1e3:.0f}ms")
+
+        scorer = RemakeScorer(ref)
+        harmony: Dict[str, float] = {}
+        print(f"reference tempo: {scorer.ref_tempo:.1f} bpm\n")
+        print(f"{'remake':<16} {'progress':>8} {'rhythm':>7} {'harmony':>8} {'tempo':>6} {'bpm':>6} {'ms':>6}")
+        for name, path in paths.items():
+            t0 = time.perf_counter()
+            s = scorer.score(name, path)
+            dt = time.perf_counter() - t0
+            print(f"{name:<16} {s.progress:>7}% {s.rhythm:>7.2f} {s.harmony:>8.2f} {s.tempo:>6.2f} {s.tempo_bpm:>6.1f} {dt * 1e3:>6.0f}")
+            harmony[name] = s.harmony
+        if harmony["different song"] >= harmony["half done"]:
+            print("  warning: a different song matches the reference's harmony better than a half-done remake")
+
+        # resubmission: the group fixes 8 seconds of the half-done remake
+        fixed = remakes["half done"].copy()
+        a, b = int(seconds / 2 * SAMPLE_RATE), int((seconds / 2 + 8) * SAMPLE_RATE)
+        fixed[a:b] = synth_song(seconds, 96.0, roots, seed=3)[a:b]
+        write_wav(paths["half done"], fixed)
+        t0 = time.perf_counter()
+        inc = scorer.score("half done", paths["half done"], changed=[(seconds / 2, seconds / 2 + 8)])
+        dt_inc = time.perf_counter() - t0
+        full = RemakeScorer(ref).score("x", paths["half done"])
+        print(f"\nresubmit 8s change: {dt_inc * 1e3:.0f}ms, {inc.recomputed_segments}/{scorer.n_segments} segments, "
+              f"progress {inc.progress}% (full rescore: {full.progress}%, diff {abs(inc.total - full.total):.1e})")
+
+        group_paths = [paths["close remake"]] * group
+        t0 = time.perf_counter()
+        score_group(ref_path, group_paths, cache_dir, workers)
+        dt = time.perf_counter() - t0
+        print(f"group of {group} submitting at once: {dt * 1e3:.0f}ms total, workers={workers or os.cpu_count()}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="crowd·noise remake scoring")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="score synthetic remakes of a synthetic song")
+    b.add_argument("--seconds", type=float, default=180.0)
+    b.add_argument("--group", type=int, default=6)
+    b.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        bench(args.seconds, args.group, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
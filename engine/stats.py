@@ -0,0 +1,17 @@
+"""
+Small helpers shared by the benchmarks. Stdlib only, so `reminders` can use
+them without pulling in numpy.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Sequence
+
+
+def pct(values: Sequence[float], p: float) -> float:
+    """Nearest-rank p-th percentile (0.0 for no values)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100.0 * len(values)) - 1))]